@@ -13,13 +13,23 @@ WHAT HAPPENS HERE:
 3. Endpoints check tokens to verify user is logged in
 """
 
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt  # JWT token library
+from typing import Optional, Union
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import time
+import jwt  # JWT token library (PyJWT)
 import bcrypt  # Password hashing library
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from backend.cache import TTLCache, REDIS_ERRORS, redis_async, redis_sync
 from backend.database import get_db
 from backend.models import User
 import os
@@ -36,200 +46,517 @@ import os
 # export JWT_SECRET_KEY="your-super-secret-long-random-string-here"
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-this-in-production")
 
+# Same key as bytes, converted once here instead of on every encode/decode
+_SECRET_KEY_BYTES = SECRET_KEY.encode("utf-8")
+
 # Algorithm used to sign JWT tokens
 # HS256 = HMAC with SHA-256 (industry standard)
 ALGORITHM = "HS256"
 
+# Allowed algorithms when decoding (built once, not on every request)
+_ALGORITHMS = [ALGORITHM]
+
 # How long tokens last before expiring
 # 60 * 24 * 7 = 60 minutes * 24 hours * 7 days = 1 week
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7
 
+# Same lifetime in seconds (JWT "exp" is a UNIX timestamp in seconds)
+_DEFAULT_EXPIRE_SECONDS = ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
 # Security scheme for FastAPI
 # Tells FastAPI to expect "Bearer <token>" in Authorization header
 security = HTTPBearer()
 
+# A JWT is "header.payload.signature"; anything outside these lengths is
+# rejected before any base64/JSON/HMAC work is done
+_MIN_TOKEN_LENGTH = 20
+_MAX_TOKEN_LENGTH = 4096
+
+def _credentials_exception() -> HTTPException:
+    """
+    Error raised whenever a token is invalid or its user no longer exists.
+    
+    A new exception every time: raising one shared instance from requests
+    running at the same time would mix up its traceback between them.
+    """
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,  # 401 = Not Authorized
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},  # Tell client to try Bearer token
+    )
+
+# Cache of tokens that already passed verification
+# Format: {token_string: user_id}
+# Clients send the same token on every request for its whole lifetime,
+# so re-checking the signature each time is wasted work.
+# Each entry expires at the token's own "exp" time.
+# Only VALID tokens are ever stored here.
+_token_cache = TTLCache(maxsize=10_000, ttl=_DEFAULT_EXPIRE_SECONDS)
+
+# Short-lived cache of user rows for authenticated requests
+# Format: {user_id: {column_name: value, ...}}
+# Every protected endpoint needs the current user, so the same row is read
+# from the database over and over. Keeping a copy for 30 seconds removes that
+# round trip for active users. Entries are dropped when a profile is updated
+# (see invalidate_user_cache).
+_user_cache = TTLCache(maxsize=4096, ttl=30)
+
+# Same snapshots in Redis (only if REDIS_URL is set), shared by all workers
+# Key: "user:{user_id}", value: JSON snapshot, expires after 60 seconds
+# A worker that misses its own cache can still skip the database, and
+# invalidate_user_cache deletes the key so every worker sees profile changes.
+_SHARED_USER_CACHE_SECONDS = 60
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """
+    Read-only copy of the logged-in user's profile (what get_current_user_profile returns).
+    
+    WHY NOT A User OBJECT?
+    This copy usually comes from the cache, not from the database. A real User
+    built from it would have no session, empty relationships (products,
+    saved_items) and no profile_image_data, yet look like a normal database
+    row. A separate, frozen class makes it clear it is just data: to change
+    the user (or follow a relationship), load it with db.get(User, user.id).
+    
+    Deliberately leaves out password_hash (not needed after login) and
+    profile_image_data (a large Base64 blob).
+    """
+    id: int
+    full_name: str
+    username: str
+    email: str
+    university_id: Optional[int]
+    bio: Optional[str]
+    profile_image: Optional[str]
+    phone: Optional[str]
+    created_at: Optional[datetime]
+
+# Columns copied into the cache (the CurrentUser fields)
+_USER_CACHE_COLUMNS = tuple(field.name for field in fields(CurrentUser))
+
+# Cache of recent password checks
+# Format: {hmac_digest: True/False}
+# bcrypt is slow on purpose (~250ms per check), so repeating the exact same
+# check (same password against the same hash) within a minute is served from
+# here instead. The key is an HMAC digest, so plain passwords are never stored.
+_verify_cache = TTLCache(maxsize=4096, ttl=60)
+
+# Secret "pepper" mixed into the cache keys
+# If not set, a random one is generated each time the server starts
+#
+# How to set in production:
+# export VERIFY_CACHE_PEPPER="another-long-random-string"
+_VERIFY_CACHE_PEPPER = os.getenv("VERIFY_CACHE_PEPPER", "").encode("utf-8") or os.urandom(32)
+
 # =============================================================================
 # PASSWORD HASHING FUNCTIONS
 # =============================================================================
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+# Marker stored in front of hashes that use SHA-256 pre-hashing
+# Example: "$bcrypt-sha256$$2b$12$abc..."
+# Hashes WITHOUT this marker are older plain bcrypt hashes (still supported)
+BCRYPT_SHA256_PREFIX = "$bcrypt-sha256$"
+_BCRYPT_SHA256_PREFIX_BYTES = BCRYPT_SHA256_PREFIX.encode("ascii")
+
+# bcrypt cost factor: hashing does 2^BCRYPT_ROUNDS rounds of work
+# Default 10 (OWASP's minimum); set BCRYPT_COST to tune it (OWASP suggests 10-13)
+# Each +1 doubles the CPU time of every login/registration
+# New hashes use this cost. Existing hashes keep the cost they were made with
+# until the user's next login, which re-hashes them (see password_needs_rehash)
+BCRYPT_ROUNDS = min(max(int(os.getenv("BCRYPT_COST", "10")), 4), 31)  # bcrypt allows 4-31
+
+def _to_bytes(value: Union[str, bytes]) -> bytes:
+    """Return value as UTF-8 bytes (bytes are passed through untouched)."""
+    return value if isinstance(value, bytes) else value.encode('utf-8')
+
+def _prehash_password(password_bytes: bytes) -> bytes:
+    """
+    Turn a password of any length into a fixed 44-byte value for bcrypt.
+    
+    WHY?
+    - bcrypt only looks at the first 72 bytes of a password
+    - Long passwords used to be silently cut off (weaker than they look)
+    - SHA-256 digests the WHOLE password, base64 keeps it printable
+      (bcrypt stops at NUL bytes, which raw digests can contain)
+    
+    Same approach as passlib's bcrypt_sha256 scheme.
+    """
+    return base64.b64encode(hashlib.sha256(password_bytes).digest())
+
+def verify_password(plain_password: Union[str, bytes], hashed_password: Union[str, bytes]) -> bool:
     """
     Verify a plain text password against a bcrypt hash.
     
     THIS IS USED FOR: Login (checking if password matches stored hash)
     
     PARAMETERS:
-    - plain_password: Password user typed in login form
-    - hashed_password: Password hash stored in database
+    - plain_password: Password user typed in login form (str or UTF-8 bytes)
+    - hashed_password: Password hash stored in database (str or bytes)
     
     RETURNS: True if password matches, False otherwise
     
     HOW IT WORKS:
-    1. Convert plain password to bytes (bcrypt needs bytes, not strings)
-    2. Check if password is longer than 72 chars (bcrypt limit)
-    3. Use bcrypt to verify: Does the hash match this password?
-    4. Return True or False
+    1. Convert to bytes if needed (bcrypt needs bytes, not strings)
+    2. If this exact password/hash pair was checked recently, return the cached result
+    3. New-style hash ($bcrypt-sha256$ marker): pre-hash the password with SHA-256
+       Old-style hash: cut the password to 72 bytes, like it was when stored
+    4. Use bcrypt to verify: Does the hash match this password?
+    5. Cache and return True or False
     """
-    # Convert password string to bytes (UTF-8 encoding)
-    password_bytes = plain_password.encode('utf-8')
+    # Convert to bytes (UTF-8 encoding), skipped if bytes were passed in
+    password_bytes = _to_bytes(plain_password)
+    hashed_bytes = _to_bytes(hashed_password)
+    
+    # Cache key: HMAC-SHA256 of password + hash (fast, and hides the password)
+    cache_key = hmac.new(
+        _VERIFY_CACHE_PEPPER, password_bytes + b"\x00" + hashed_bytes, hashlib.sha256
+    ).digest()
+    cached = _verify_cache.get(cache_key)
+    if cached is not None:
+        return cached
     
-    # Bcrypt limitation: Can only hash passwords up to 72 bytes
-    # Truncate if longer to prevent errors
-    if len(password_bytes) > 72:
+    if hashed_bytes.startswith(_BCRYPT_SHA256_PREFIX_BYTES):
+        # New-style hash: strip the marker, compare against the SHA-256 digest
+        bcrypt_hash = hashed_bytes[len(_BCRYPT_SHA256_PREFIX_BYTES):]
+        password_bytes = _prehash_password(password_bytes)
+    else:
+        # Old-style hash: bcrypt only used the first 72 bytes when it was created
+        bcrypt_hash = hashed_bytes
         password_bytes = password_bytes[:72]
     
     # bcrypt.checkpw returns True if password matches hash, False otherwise
-    # Convert hashed_password to bytes too (it's stored as string in DB)
-    return bcrypt.checkpw(password_bytes, hashed_password.encode('utf-8'))
+    result = bcrypt.checkpw(password_bytes, bcrypt_hash)
+    _verify_cache.set(cache_key, result)
+    return result
 
-def get_password_hash(password: str) -> str:
+def get_password_hash(password: Union[str, bytes]) -> str:
     """
     Hash a plain text password using bcrypt.
     
     THIS IS USED FOR: Registration (storing password securely)
     
     PARAMETERS:
-    - password: Plain text password from registration form
+    - password: Plain text password from registration form (str or UTF-8 bytes)
     
     RETURNS: Hashed password string (safe to store in database)
     
     HOW IT WORKS:
-    1. Convert password to bytes
-    2. Generate a salt (random string added to password before hashing)
-    3. Hash password + salt using bcrypt
-    4. Return the hash as a string
+    1. Convert password to bytes if needed
+    2. Pre-hash it with SHA-256 (so passwords longer than 72 bytes still count fully)
+    3. Generate a salt (random string added to password before hashing)
+    4. Hash password + salt using bcrypt
+    5. Return the hash as a string, marked with "$bcrypt-sha256$"
     
     WHY BCRYPT?
     - Bcrypt is SLOW on purpose (prevents brute force attacks)
     - If attacker steals hashes, it takes forever to crack them
     - Even with a supercomputer, each guess takes real time
     """
-    # Convert password string to bytes
-    password_bytes = password.encode('utf-8')
-    
-    # Truncate if longer than 72 bytes (bcrypt limit)
-    if len(password_bytes) > 72:
-        password_bytes = password_bytes[:72]
+    # Convert password to bytes, then pre-hash to a fixed 44 bytes
+    password_bytes = _prehash_password(_to_bytes(password))
     
     # bcrypt.hashpw does the actual hashing
-    # bcrypt.gensalt() generates a random salt (default 12 rounds of hashing)
+    # bcrypt.gensalt() generates a random salt (2^BCRYPT_ROUNDS rounds of hashing)
     # Returns bytes, so .decode('utf-8') converts back to string for storage
-    return bcrypt.hashpw(password_bytes, bcrypt.gensalt()).decode('utf-8')
+    return BCRYPT_SHA256_PREFIX + bcrypt.hashpw(password_bytes, bcrypt.gensalt(BCRYPT_ROUNDS)).decode('utf-8')
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """
+    Should this stored hash be replaced with a fresh one?
+    
+    True for old-style hashes (no "$bcrypt-sha256$" marker) and for hashes
+    made with a different cost than BCRYPT_ROUNDS (e.g. after BCRYPT_COST
+    was changed). Login calls this after a successful password check - the
+    only time the plain password is available to make the new hash.
+    
+    Bcrypt hash layout: "$2b$12$<salt+hash>" - the cost is characters 4-5.
+    """
+    if not hashed_password.startswith(BCRYPT_SHA256_PREFIX):
+        return True
+    bcrypt_hash = hashed_password[len(BCRYPT_SHA256_PREFIX):]
+    return bcrypt_hash[4:6] != "%02d" % BCRYPT_ROUNDS
+
+# A real hash of a random password nobody knows. Login checks the typed
+# password against this when the email isn't registered, so an unknown email
+# takes as long to reject as a wrong password (the response time doesn't
+# reveal which emails have accounts). Made once at startup (same cost factor).
+DUMMY_PASSWORD_HASH = get_password_hash(os.urandom(32))
+
+# =============================================================================
+# ASYNC PASSWORD HELPERS (for async endpoints)
+# =============================================================================
+# bcrypt takes ~250ms of CPU per call. Running it directly inside an
+# "async def" endpoint would freeze the whole server for that time.
+#
+# Instead, the work is handed to a dedicated pool of threads:
+# - bcrypt's C code releases the GIL, so threads really run in parallel
+# - One thread per CPU core: more would only fight over the same cores
+# - Separate from FastAPI's shared thread pool, so a burst of logins
+#   can't starve normal endpoints of threads
+_password_pool = ThreadPoolExecutor(
+    max_workers=os.cpu_count() or 1,
+    thread_name_prefix="bcrypt"
+)
+
+async def verify_password_async(plain_password: Union[str, bytes], hashed_password: Union[str, bytes]) -> bool:
+    """Same as verify_password, but runs on the bcrypt thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_pool, verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: Union[str, bytes]) -> str:
+    """Same as get_password_hash, but runs on the bcrypt thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_pool, get_password_hash, password)
 
 # =============================================================================
 # JWT TOKEN FUNCTIONS
 # =============================================================================
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+def create_access_token(user_id: int, expires_delta: Optional[timedelta] = None) -> str:
     """
     Create a JWT token for a user.
     
     THIS IS USED FOR: Login (giving user a token to stay logged in)
     
     PARAMETERS:
-    - data: Dictionary with info to encode in token (usually {"userId": 123})
+    - user_id: ID of the user the token is for (stored as "userId")
     - expires_delta: How long until token expires (optional, uses default if None)
     
     RETURNS: JWT token string (send this to frontend)
     
     HOW IT WORKS:
-    1. Copy the data dict (don't modify original)
-    2. Calculate expiration time
-    3. Add expiration time to the token data
-    4. Sign the token using SECRET_KEY
-    5. Return the signed token
+    1. Calculate expiration time (UNIX timestamp, what JWT "exp" expects)
+    2. Build the token data in one go: {"userId": ..., "exp": ...}
+    3. Sign the token using SECRET_KEY
+    4. Return the signed token
     """
-    # Make a copy of data so we don't modify the original dict
-    to_encode = data.copy()
-    
-    # Calculate expiration time
+    # Calculate expiration time as a UNIX timestamp (seconds)
     if expires_delta:
         # If custom expiration provided, use it
-        expire = datetime.utcnow() + expires_delta
+        expire = int(time.time()) + int(expires_delta.total_seconds())
     else:
         # Otherwise use default (1 week)
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = int(time.time()) + _DEFAULT_EXPIRE_SECONDS
     
-    # Add expiration time to token data
+    # Token data: who the token is for + when it expires
     # "exp" is the JWT standard field for expiration
-    to_encode.update({"exp": expire})
+    to_encode = {"userId": user_id, "exp": expire}
     
     # Encode the data into a JWT token
     # jwt.encode(data, secret_key, algorithm)
     # Returns a token string that can be verified using SECRET_KEY
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, _SECRET_KEY_BYTES, algorithm=ALGORITHM)
     
     return encoded_jwt
 
+# =============================================================================
+# USER CACHE HELPERS
+# =============================================================================
+
+def invalidate_user_cache(user_id: int) -> None:
+    """
+    Forget the cached copy of a user.
+    
+    THIS IS USED FOR: Endpoints that change a user's profile, so the next
+    request sees the new data instead of a copy up to 30 seconds old.
+    """
+    _user_cache.pop(user_id)
+    if redis_sync is not None:
+        try:
+            redis_sync.delete(f"user:{user_id}")
+        except REDIS_ERRORS:
+            pass  # Redis down: the shared copy still expires on its own
+
+def _get_cached_user(user_id: int) -> Optional[CurrentUser]:
+    """
+    Get a user from the short-lived user cache.
+    
+    RETURNS: A CurrentUser copy, or None if the user isn't cached
+    """
+    snapshot = _user_cache.get(user_id)
+    if snapshot is None:
+        return None
+    return CurrentUser(**snapshot)
+
+def _load_user(db: Session, user_id: int) -> Optional[CurrentUser]:
+    """
+    Get a user from the database and cache a copy of it.
+    
+    RETURNS: A CurrentUser copy, or None if the user does not exist
+    """
+    # Session.get() checks the identity map first and uses a cached
+    # primary-key SELECT, so it's cheaper than building a Query each time
+    user = db.get(User, user_id)
+    if user is not None:
+        snapshot = {column: getattr(user, column) for column in _USER_CACHE_COLUMNS}
+        _user_cache.set(user_id, snapshot)
+        if redis_sync is not None:
+            try:
+                redis_sync.setex(f"user:{user_id}", _SHARED_USER_CACHE_SECONDS, json.dumps(snapshot, default=str))
+            except REDIS_ERRORS:
+                pass  # Caching is optional - the user was still loaded
+        return CurrentUser(**snapshot)
+    return None
+
+async def _get_shared_cached_user(user_id: int) -> Optional[CurrentUser]:
+    """
+    Get a user from the shared Redis cache (if configured).
+    
+    On a hit, the snapshot is also copied into this worker's own cache.
+    
+    RETURNS: A CurrentUser copy (like _get_cached_user), or None
+    """
+    try:
+        payload = await redis_async.get(f"user:{user_id}")
+    except REDIS_ERRORS:
+        return None  # Redis down: just use the database
+    if payload is None:
+        return None
+    snapshot = json.loads(payload)
+    # JSON has no datetime type, so created_at was stored as text
+    if snapshot.get("created_at"):
+        snapshot["created_at"] = datetime.fromisoformat(snapshot["created_at"])
+    _user_cache.set(user_id, snapshot)
+    return CurrentUser(**snapshot)
+
 # =============================================================================
 # JWT VERIFICATION FUNCTION
 # =============================================================================
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
+async def get_current_user_id(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> int:
     """
-    Verify JWT token and get the current logged-in user.
+    Verify JWT token and return the logged-in user's ID (no database query).
     
-    THIS IS USED FOR: Protected endpoints (to check if user is logged in)
+    THIS IS USED FOR: Protected endpoints that only need to know WHO is calling
+    (e.g. "is this my product?", "save this item for me")
     
     PARAMETERS:
     - credentials: Authorization header info (provided by FastAPI's HTTPBearer)
-    - db: Database session (provided by FastAPI Depends)
     
-    RETURNS: User object if token is valid, raises exception otherwise
+    RETURNS: userId from the token, raises 401 if the token is invalid
     
     HOW IT WORKS:
-    1. Extract token from "Authorization: Bearer <token>" header
-    2. Decode and verify the JWT token using SECRET_KEY
-    3. Extract userId from token
-    4. Look up that user in database
-    5. Return user object if found
-    6. Raise 401 error if token invalid or user not found
+    1. Extract token from "Authorization: Bearer <token>" header and reject
+       it straight away if it can't be a JWT (wrong length or not 3 parts)
+    2. If this token was verified recently, reuse its cached userId
+    3. Otherwise decode and verify the JWT token using SECRET_KEY,
+       extract userId and cache it until the token expires
+    
+    WHY NO DATABASE?
+    The token is signed with SECRET_KEY, so once the signature checks out the
+    userId inside it can be trusted. Endpoints that need the user's name,
+    email, etc. should use get_current_user_profile instead.
     
     EXAMPLE USAGE:
-    @app.get("/api/auth/me")
-    def get_profile(current_user: User = Depends(get_current_user)):
-        return current_user  # current_user is automatically verified!
+    @app.get("/api/saved-items")
+    def get_saved_items(current_user_id: int = Depends(get_current_user_id)):
+        ...
     """
     
-    # Error to raise if credentials are invalid
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,  # 401 = Not Authorized
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},  # Tell client to try Bearer token
-    )
+    # Extract the token from the credentials
+    # credentials.credentials contains the token part of "Bearer <token>"
+    token = credentials.credentials
     
-    try:
-        # Extract the token from the credentials
-        # credentials.credentials contains the token part of "Bearer <token>"
-        token = credentials.credentials
-        
-        # Decode the JWT token using SECRET_KEY
-        # jwt.decode verifies the signature and checks expiration
-        # If token is invalid or expired, raises JWTError
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        
-        # Extract userId from token payload
-        # We stored userId in create_access_token
-        user_id = payload.get("userId")
-        
-        # Check if userId was found in token
-        if user_id is None:
-            raise credentials_exception
+    # Cheap shape check: garbage and scanner traffic never reach jwt.decode
+    if (
+        not _MIN_TOKEN_LENGTH <= len(token) <= _MAX_TOKEN_LENGTH
+        or token.count(".") != 2
+    ):
+        raise _credentials_exception()
+    
+    # Fast path: this token was already verified and hasn't expired yet
+    user_id = _token_cache.get(token)
+    
+    if user_id is None:
+        try:
+            # Decode the JWT token using SECRET_KEY
+            # jwt.decode verifies the signature and checks expiration
+            # If token is invalid or expired, raises jwt.PyJWTError
+            payload = jwt.decode(token, _SECRET_KEY_BYTES, algorithms=_ALGORITHMS)
             
-    except JWTError:
-        # If any JWT error occurs (invalid, expired, etc.)
-        raise credentials_exception
+            # Extract userId from token payload
+            # We stored userId in create_access_token
+            user_id = payload.get("userId")
+            
+            # Check if userId was found in token
+            if user_id is None:
+                raise _credentials_exception()
+                
+        except jwt.PyJWTError:
+            # If any JWT error occurs (invalid, expired, etc.)
+            raise _credentials_exception()
+        
+        # Remember the verified token until it expires
+        _token_cache.set(token, user_id, expires_at=payload.get("exp"))
+    
+    return user_id
+
+async def get_current_user_profile(
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+) -> CurrentUser:
+    """
+    Verify JWT token and get the current logged-in user's profile (cached).
+    
+    THIS IS USED FOR: Protected endpoints that need to READ the user's details
+    (name, email, ...), e.g. /api/auth/me
+    
+    PARAMETERS:
+    - user_id: ID from the verified token (provided by get_current_user_id)
+    - db: Database session (provided by FastAPI Depends)
+    
+    RETURNS: A read-only CurrentUser (not a database User), raises 401 if
+    the token is invalid or the user no longer exists
+    
+    HOW IT WORKS:
+    1. get_current_user_id verifies the token and gives us the userId
+    2. Look up that user (short-lived cache first, then the shared Redis
+       cache if configured, then the database in a worker thread, so the
+       event loop keeps serving other requests)
+    3. Return the profile copy if found
+    4. Raise 401 error if user not found
+    
+    EXAMPLE USAGE:
+    @app.get("/api/auth/me")
+    def get_profile(current_user: CurrentUser = Depends(get_current_user_profile)):
+        return current_user  # current_user is automatically verified!
+    """
     
-    # Query database for the user with this ID
-    user = db.query(User).filter(User.id == user_id).first()
+    # Look up the user with this ID (cached copy if it was loaded recently)
+    user = _get_cached_user(user_id)
+    if user is None and redis_async is not None:
+        # Not in this worker's cache - maybe another worker cached it
+        user = await _get_shared_cached_user(user_id)
+    if user is None:
+        # A database query blocks, so run it in FastAPI's thread pool
+        user = await run_in_threadpool(_load_user, db, user_id)
     
     # Check if user exists
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    
+    return user
+
+async def get_current_user(
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+) -> User:
+    """
+    Verify JWT token and get the current logged-in user from the database.
     
-    # Return the user object
-    # If we got here, token is valid and user exists
+    THIS IS USED FOR: Protected endpoints that need the real User row, e.g.
+    to change it or follow its relationships (products, saved_items).
+    Endpoints that only read the profile should use get_current_user_profile,
+    which usually skips the database.
+    
+    RETURNS: The User (attached to this request's session), raises 401 if
+    the user no longer exists
+    """
+    # Session.get() is a primary-key lookup; it blocks, so use the thread pool
+    user = await run_in_threadpool(db.get, User, user_id)
+    if user is None:
+        raise _credentials_exception()
     return user
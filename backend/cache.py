@@ -0,0 +1,136 @@
+"""
+IN-PROCESS CACHE MODULE
+=======================
+This module provides a small thread-safe cache used to avoid repeating
+expensive work (JWT verification, database lookups) on hot request paths.
+
+WHAT HAPPENS HERE:
+1. Values are stored in memory together with an expiry time
+2. Old entries are evicted when the cache is full (least recently used first)
+3. Expired entries are treated as missing and removed on access
+
+WHY NOT A LIBRARY?
+- The needs are tiny (get/set/pop with expiry)
+- FastAPI runs sync endpoints in a thread pool, so every access is guarded
+  by a lock to keep the cache consistent across threads
+
+SHARED CACHE (OPTIONAL):
+An in-process cache only lives inside one server process. When the app runs
+several workers, set REDIS_URL (and install the optional "redis" extra,
+e.g. pip install ".[redis]") to also share cached data between them - see
+redis_sync/redis_async below.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Marker used to tell "not in cache" apart from a cached None value
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    A bounded least-recently-used cache whose entries expire.
+
+    PARAMETERS:
+    - maxsize: Maximum number of entries kept in memory
+    - ttl: Default lifetime of an entry in seconds
+
+    HOW IT WORKS:
+    1. Each entry is stored as (expires_at, value) in an OrderedDict
+    2. get() moves the entry to the end (most recently used)
+    3. set() evicts from the front (least recently used) when full
+    4. An entry past its expiry time is deleted and reported as missing
+
+    EXAMPLE USAGE:
+    cache = TTLCache(maxsize=1000, ttl=30)
+    cache.set("key", "value")
+    cache.get("key")  # "value" (until 30 seconds pass)
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or default if missing/expired."""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.time():
+                # Expired: drop it so it doesn't take up space
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[float] = None) -> None:
+        """
+        Store a value.
+
+        expires_at (optional): Absolute UNIX timestamp for this entry.
+        It is capped by the cache's own ttl so nothing lives longer than that.
+        """
+        deadline = time.time() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        with self._lock:
+            self._data[key] = (deadline, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove an entry (used to invalidate stale data)."""
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+# =============================================================================
+# OPTIONAL SHARED CACHE (REDIS)
+# =============================================================================
+# Set REDIS_URL (e.g. "redis://localhost:6379/0") to enable.
+# The clients are created ONCE per process from the same URL and shared by
+# everything that needs Redis (each keeps its own small connection pool):
+# - redis_sync: for sync code (endpoints running in FastAPI's thread pool)
+# - redis_async: for async code (awaited directly on the event loop)
+# (Socket.IO's Redis manager opens its own connections, see backend/main.py)
+# All are None when Redis isn't configured, so callers just check for None.
+# Redis is a cache here, never the source of truth: if it's down, callers
+# catch REDIS_ERRORS and fall back to the database.
+REDIS_URL = os.getenv("REDIS_URL")
+
+redis_sync = None
+redis_async = None
+REDIS_ERRORS: tuple = ()
+
+if REDIS_URL:
+    try:
+        import redis
+        import redis.asyncio
+    except ImportError:
+        logger.warning("REDIS_URL is set but the 'redis' package is not installed; shared cache disabled")
+    else:
+        redis_sync = redis.Redis.from_url(REDIS_URL, socket_timeout=0.5)
+        redis_async = redis.asyncio.Redis.from_url(REDIS_URL, socket_timeout=0.5)
+        REDIS_ERRORS = (redis.RedisError,)
@@ -11,7 +11,7 @@ WHAT HAPPENS HERE:
 4. Seeds the database with initial data (universities and categories)
 """
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -56,11 +56,71 @@ if SQLALCHEMY_DATABASE_URL and SQLALCHEMY_DATABASE_URL.startswith("postgres://")
 
 # Create the database engine
 # check_same_thread=False is needed only for SQLite
-connect_args = {"check_same_thread": False} if "sqlite" in SQLALCHEMY_DATABASE_URL else {}
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args=connect_args
-)
+# Connection pool size (connections kept open) and overflow (extra
+# connections allowed during bursts, closed again afterwards)
+# SQLAlchemy's default of 5 + 10 runs out quickly under concurrent requests
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+if IS_SQLITE:
+    engine_kwargs = {"connect_args": {"check_same_thread": False}}
+    if ":memory:" in SQLALCHEMY_DATABASE_URL or SQLALCHEMY_DATABASE_URL in ("sqlite://", "sqlite:///"):
+        # An in-memory database only exists inside one connection,
+        # so every session has to share that single connection
+        from sqlalchemy.pool import StaticPool
+        engine_kwargs["poolclass"] = StaticPool
+    else:
+        # File database: keep a pool of connections (QueuePool) so
+        # concurrent requests don't queue behind one connection
+        engine_kwargs.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+else:
+    engine_kwargs = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        # Test connections before use so a connection dropped by the
+        # server (idle timeout, restart) is replaced instead of failing a request
+        "pool_pre_ping": True,
+        # Replace connections after an hour, before hosted databases/proxies
+        # close long-lived idle connections on their side
+        "pool_recycle": 3600,
+        # Wait at most 30 seconds for a free connection, then raise an error
+        # (instead of hanging forever when the pool is exhausted)
+        "pool_timeout": 30,
+    }
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_kwargs)
+
+if IS_SQLITE:
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """
+        Tune every new SQLite connection.
+        
+        - journal_mode=WAL: readers no longer wait for writers (and vice versa)
+        - synchronous=NORMAL: safe with WAL, far fewer fsync calls per commit
+        - temp_store=MEMORY: temporary tables/indexes for sorting stay in RAM
+        - mmap_size=256MB: read pages through memory mapping instead of read()
+        """
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.close()
+
+# =============================================================================
+# INSERT ... ON CONFLICT DO NOTHING
+# =============================================================================
+# SQLite and PostgreSQL both support "INSERT ... ON CONFLICT DO NOTHING"
+# (skip rows that would break a unique constraint), but SQLAlchemy provides
+# it through each database's own insert(). upsert_insert is the one that
+# matches our database, so the rest of the code doesn't need to care.
+if engine.dialect.name == "postgresql":
+    from sqlalchemy.dialects.postgresql import insert as upsert_insert
+else:
+    from sqlalchemy.dialects.sqlite import insert as upsert_insert
 
 # =============================================================================
 # SESSION FACTORY
@@ -113,59 +173,163 @@ def get_db():
 # =============================================================================
 # This function runs when the app starts up
 # It creates all tables and adds initial data if needed
+def _create_search_indexes():
+    """
+    Create pg_trgm GIN indexes on products.name and products.description.
+    
+    WHY?
+    A normal (B-tree) index can't help with "contains" searches like
+    ILIKE '%calculus%', so PostgreSQL has to read every product.
+    A trigram index splits text into 3-letter pieces and can find matches
+    for ILIKE patterns directly, which keeps search fast as the catalog grows.
+    
+    Creating the extension needs database owner rights. If that isn't
+    allowed, search still works (just without the index), so we only
+    print a warning instead of stopping the server.
+    """
+    from sqlalchemy import text
+    
+    try:
+        with engine.begin() as connection:
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            connection.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_products_name_trgm "
+                "ON products USING gin (name gin_trgm_ops)"
+            ))
+            connection.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_products_description_trgm "
+                "ON products USING gin (description gin_trgm_ops)"
+            ))
+    except Exception as e:
+        print(f"Warning: could not create product search indexes: {e}")
+
 def init_db():
     """
     Initialize the database by:
     1. Creating all tables (based on models defined in backend/models.py)
     2. Adding initial data (universities and product categories)
+    
+    HOW IT WORKS:
+    - Seed rows are written with "INSERT ... ON CONFLICT DO NOTHING", so rows
+      that already exist are skipped by the database itself (no COUNT queries)
+    - Product locations are fixed with one UPDATE statement instead of
+      loading every product into Python
+    - Everything runs in a single transaction with a single commit, so startup
+      costs the same few round-trips no matter how big the catalog gets
     """
     
     # Import models - these define what tables to create
-    from backend.models import User, University, Category, Product, ProductImage, SavedItem
+    from backend.models import User, University, Category, Product, ProductImage, SavedItem, Message, Conversation
+    from sqlalchemy import case, func, inspect, or_, select, text, update
+    from sqlalchemy.exc import IntegrityError
+    from sqlalchemy.schema import CreateIndex
+    
+    # Remember whether the conversations table is new (see below)
+    conversations_existed = inspect(engine).has_table("conversations")
     
     # Create all tables in the database
     # This checks the Base class and all models that inherit from it
     # and creates corresponding tables if they don't exist
     Base.metadata.create_all(bind=engine)
     
-    # Create a new database session for seeding data
-    db = SessionLocal()
-    try:
-        # ===== SEED: Add Universities if they don't exist =====
-        # Check if any universities already exist
-        if db.query(University).count() == 0:
-            # If no universities, create Baze University
-            baze = University(
-                id=1,
-                name="Baze University",
-                domain="bazeuniversity.edu.ng"  # Users must use this domain to register
+    # The unique (user_id, product_id) index on saved_items can't be built
+    # while duplicate saves exist (older databases allowed them), so remove
+    # the duplicates first - only needed once, before the index exists
+    saved_item_indexes = {index["name"] for index in inspect(engine).get_indexes("saved_items")}
+    if "uq_saved_items_user_product" not in saved_item_indexes:
+        with engine.begin() as connection:
+            connection.execute(text(
+                "DELETE FROM saved_items WHERE id NOT IN "
+                "(SELECT MIN(id) FROM saved_items GROUP BY user_id, product_id)"
+            ))
+    
+    # create_all() skips tables that already exist, including their indexes,
+    # so add any index that was defined after the table was first created
+    # (CREATE INDEX IF NOT EXISTS: SQLite can't look up indexes on
+    # expressions like lower(email) by name, so checkfirst isn't enough)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                with engine.begin() as connection:
+                    connection.execute(CreateIndex(index, if_not_exists=True))
+            except IntegrityError:
+                # A unique index can't be built over existing duplicates
+                # (e.g. two old accounts whose emails differ only in case).
+                # Those need fixing by hand, the app still works without it
+                print(f"Warning: could not create unique index {index.name} (duplicate values exist)")
+    
+    # Indexes that a newer index has replaced: drop them from older databases
+    # (each one still costs time on every INSERT into its table)
+    # - idx_messages_sender_receiver (sender_id, receiver_id) is the start of
+    #   idx_messages_sender_receiver_created, which serves the same lookups
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX IF EXISTS idx_messages_sender_receiver"))
+    
+    # PostgreSQL only: trigram indexes so product search (ILIKE '%text%')
+    # can use an index instead of scanning every product
+    if engine.dialect.name == "postgresql":
+        _create_search_indexes()
+    
+    # The conversations table summarizes the messages table. When it has just
+    # been created, fill it from the existing messages in ONE statement:
+    # group messages by user pair (smaller ID first) and take the newest
+    # message ID plus each side's unread count
+    if not conversations_existed:
+        user_a = case((Message.sender_id < Message.receiver_id, Message.sender_id), else_=Message.receiver_id)
+        user_b = case((Message.sender_id < Message.receiver_id, Message.receiver_id), else_=Message.sender_id)
+        unread = Message.is_read == 0
+        summary = (
+            select(
+                user_a,
+                user_b,
+                func.max(Message.id),
+                # Unread by A = unread messages A received (A is the receiver)
+                func.sum(case((unread & (Message.receiver_id < Message.sender_id), 1), else_=0)),
+                func.sum(case((unread & (Message.receiver_id > Message.sender_id), 1), else_=0)),
+            )
+            .where(Message.sender_id != Message.receiver_id)
+            .group_by(user_a, user_b)
+        )
+        with engine.begin() as connection:
+            connection.execute(
+                upsert_insert(Conversation)
+                .from_select(
+                    ["user_a_id", "user_b_id", "last_message_id", "unread_count_a", "unread_count_b"],
+                    summary
+                )
+                .on_conflict_do_nothing()
             )
-            db.add(baze)  # Add to session (not in database yet)
-            db.commit()  # Save to database
+    
+    # Create a new database session for seeding data
+    # db.begin() commits once at the end (or rolls back if anything fails)
+    with SessionLocal() as db, db.begin():
+        # ===== SEED: Add Baze University if it doesn't exist =====
+        # Users must use this domain to register
+        db.execute(
+            upsert_insert(University)
+            .values(id=1, name="Baze University", domain="bazeuniversity.edu.ng")
+            .on_conflict_do_nothing()
+        )
         
         # ===== SEED: Add Product Categories if they don't exist =====
-        # Check if any categories already exist
-        if db.query(Category).count() == 0:
-            # If no categories, create default ones
-            categories = [
-                Category(name="Textbooks"),      # For school books
-                Category(name="Electronics"),    # For laptops, phones, etc.
-                Category(name="Clothing"),       # For clothes
-                Category(name="Furniture"),      # For desks, chairs, etc.
-                Category(name="Other")           # For miscellaneous items
-            ]
-            db.add_all(categories)  # Add all categories to session
-            db.commit()  # Save to database
+        # Category.name is unique, so existing categories are skipped
+        db.execute(
+            upsert_insert(Category)
+            .values([
+                {"name": "Textbooks"},      # For school books
+                {"name": "Electronics"},    # For laptops, phones, etc.
+                {"name": "Clothing"},       # For clothes
+                {"name": "Furniture"},      # For desks, chairs, etc.
+                {"name": "Other"},          # For miscellaneous items
+            ])
+            .on_conflict_do_nothing()
+        )
         
         # ===== UPDATE: Set all existing products location to "Baze University" =====
-        # For existing products that may have different locations, update them
         # Since only Baze University students can sell, all products are at Baze
-        existing_products = db.query(Product).all()
-        for product in existing_products:
-            if not product.location or product.location != "Baze University":
-                product.location = "Baze University"
-        if existing_products:
-            db.commit()
-    finally:
-        # Always close the session when done
-        db.close()
+        # One UPDATE touches only the rows that need it
+        db.execute(
+            update(Product)
+            .where(or_(Product.location.is_(None), Product.location != "Baze University"))
+            .values(location="Baze University")
+        )
@@ -73,30 +73,37 @@ For detailed endpoint documentation, see:
 ================================================================================
 """
 
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Query, Response
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Query, Request, Response
 from fastapi.responses import FileResponse, RedirectResponse  # Serve HTML files
 from fastapi.middleware.cors import CORSMiddleware  # Allow cross-origin requests
 from fastapi.staticfiles import StaticFiles  # Serve static files (images)
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_, func, desc  # SQL query helpers
-from typing import List, Optional
+from starlette.concurrency import run_in_threadpool  # Run blocking DB calls off the event loop
+from sqlalchemy.orm import Session, joinedload, selectinload, raiseload
+from sqlalchemy import or_, and_, func, insert, update, delete, select, literal, tuple_, case, bindparam  # SQL query helpers
+from typing import List, Optional, Union
 import os
-import shutil
-import uuid  # Generate unique filenames
-from datetime import datetime
+import base64  # Images are stored Base64-encoded in the database
+import hashlib  # ETags for the cached HTML pages
+import logging
+import anyio.to_thread  # FastAPI's worker thread pool (for sync endpoints)
+import time
+from datetime import datetime, timezone
 import socketio  # Real-time websocket communication
 
 # Import database and authentication functions
-from backend.database import get_db, init_db
-from backend.models import User, University, Product, ProductImage, SavedItem, Category, Message, Comment
+from backend.database import engine, get_db, init_db, upsert_insert, SessionLocal
+from backend.cache import TTLCache, REDIS_URL, REDIS_ERRORS, redis_async
+from backend.models import User, University, Product, ProductImage, UploadedImage, SavedItem, Category, Message, Conversation, Comment
 from backend.schemas import (
     UserRegister, UserLogin, UserResponse, LoginResponse, UserUpdate,
     ProductCreate, ProductUpdate, ProductResponse, ProductListResponse,
     SavedItemToggle, SavedItemResponse, UploadResponse, MessageCreate, MessageResponse,
-    SellerInfo, CategoryResponse, ProductImageResponse, CommentCreate, CommentResponse
+    SellerInfo, CategoryResponse, ProductImageResponse, CommentCreate, CommentResponse,
+    TopSellingProductResponse, ConversationResponse
 )
 from backend.auth import (
-    get_password_hash, verify_password, create_access_token, get_current_user
+    get_password_hash_async, verify_password_async, create_access_token, get_current_user_profile, CurrentUser,
+    get_current_user_id, invalidate_user_cache, password_needs_rehash, DUMMY_PASSWORD_HASH
 )
 
 # =============================================================================
@@ -111,14 +118,54 @@ app = FastAPI(
     # ReDoc will be available at /redoc
 )
 
+# Faster JSON for Socket.IO packets: orjson (written in Rust) encodes
+# several times faster than Python's json module. Socket.IO encodes an
+# event once and sends the same text to every socket in the room, so this
+# makes every emit cheaper. orjson is a required dependency
+# (requirements.txt / pyproject.toml).
+import orjson
+
+class _OrjsonCodec:
+    """json-module look-alike (dumps/loads) backed by orjson, for Socket.IO."""
+    @staticmethod
+    def dumps(obj, *args, **kwargs) -> str:
+        # orjson output is already compact, so separators=... is ignored
+        return orjson.dumps(obj).decode()
+    
+    @staticmethod
+    def loads(data, *args, **kwargs):
+        return orjson.loads(data)
+
+# Socket.IO's Redis manager (only when REDIS_URL is set and redis is installed)
+# With several server workers, a message emitted in one worker must reach
+# sockets connected to another. The manager does that by publishing every
+# emit to a Redis channel that all workers subscribe to.
+# It gets its own connection pool (separate from the cache clients in
+# backend/cache.py): its subscriber waits for messages indefinitely, so it
+# can't use the cache's short socket timeout. health_check_interval pings
+# that idle connection so a dropped one is noticed and reopened.
+_socketio_manager = (
+    socketio.AsyncRedisManager(REDIS_URL, redis_options={"health_check_interval": 30})
+    if redis_async is not None else None
+)
+
 # Initialize Socket.IO for real-time messaging
+# With REDIS_URL set, emits are shared between all server workers through
+# Redis; otherwise everything stays in this process
 sio = socketio.AsyncServer(
     async_mode='asgi',
     cors_allowed_origins=['*'],  # Allow all origins for development
+    client_manager=_socketio_manager,
+    json=_OrjsonCodec,
     logger=False,
     engineio_logger=False
 )
 
+# Debug messages (e.g. socket connects/disconnects) go through logging
+# instead of print(): they cost almost nothing unless debug logging is
+# switched on, e.g. with: uvicorn ... --log-level debug
+logger = logging.getLogger(__name__)
+
 # Create ASGI app that combines FastAPI and Socket.IO
 from socketio import ASGIApp
 app_with_sio = ASGIApp(sio, app)
@@ -146,7 +193,23 @@ os.makedirs("backend/uploads/products", exist_ok=True)
 # Mount /uploads to serve uploaded images
 # When frontend requests: /uploads/products/image.jpg
 # It serves from: backend/uploads/products/image.jpg
-app.mount("/uploads", StaticFiles(directory="backend/uploads"), name="uploads")
+#
+# IN PRODUCTION: a web server like nginx sends files far faster than Python
+# (and doesn't tie up a worker). Put nginx in front of the app, let it serve
+# the folder, and set SERVE_UPLOADS=false so FastAPI skips this mount:
+#
+#   location /uploads/ {
+#       alias /path/to/backend/uploads/;
+#       sendfile on;
+#       tcp_nopush on;
+#       expires 30d;
+#       add_header Cache-Control "public, immutable";
+#   }
+#
+# (Filenames are random UUIDs that never get reused, so caching them
+# "forever" is safe.)
+if os.getenv("SERVE_UPLOADS", "true").lower() != "false":
+    app.mount("/uploads", StaticFiles(directory="backend/uploads"), name="uploads")
 
 # Mount static directories (CSS, JS, Images)
 app.mount("/css", StaticFiles(directory="css"), name="css")
@@ -161,6 +224,29 @@ app.mount("/img", StaticFiles(directory="img"), name="img")
 def startup_event():
     """Initialize the database on server startup"""
     init_db()  # Create tables, add default data
+    
+    # Fill the category cache now (see REFERENCE DATA CACHE below), so the
+    # first product listings after a restart don't each have to query it.
+    # The university cache is warmed the same way, for the register endpoint
+    db = SessionLocal()
+    try:
+        _get_categories(db)
+        for row in db.query(University.id, University.name, University.domain):
+            _university_cache.set(row.id, {"id": row.id, "name": row.name, "domain": row.domain})
+    finally:
+        db.close()
+
+# Number of worker threads for sync endpoints and run_in_threadpool calls
+# (every database call goes through one of these threads)
+# AnyIO's default is 40; raise it with THREADPOOL_SIZE if requests start
+# queueing under load (keep it close to DB_POOL_SIZE + DB_MAX_OVERFLOW,
+# since threads beyond that just wait for a database connection)
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+
+@app.on_event("startup")
+async def configure_threadpool():
+    """Apply THREADPOOL_SIZE (must run inside the event loop)"""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
 
 # =============================================================================
 # HEALTH CHECK ENDPOINT
@@ -170,17 +256,111 @@ def health_check():
     """
     Simple health check endpoint.
     
-    Returns: {"status": "healthy"}
+    Returns: {"status": "healthy", "dbPool": "Pool size: 20  Connections in pool: 1 ..."}
     Used by: Frontend or monitoring systems to check if API is running
+    
+    dbPool shows how many database connections are in use, which makes
+    an exhausted connection pool easy to spot under load.
     """
-    return {"status": "healthy"}
+    return {"status": "healthy", "dbPool": engine.pool.status()}
+
+# =============================================================================
+# REFERENCE DATA CACHE
+# =============================================================================
+# Universities and categories are seeded at startup and never edited through
+# the API, so there's no need to query them on every request.
+# Entries expire after 5 minutes, so rows added directly in the database
+# still show up without a restart.
+# Format: {university_id: {"id": ..., "name": ..., "domain": ...}}
+_university_cache = TTLCache(maxsize=64, ttl=300)
+
+# Format: {"all": {"rows": [{"id": 1, "name": "Textbooks"}, ...],
+#                  "by_name": {"Textbooks": 1, ...},
+#                  "by_id": {1: "Textbooks", ...},
+#                  "etag": 'W/"c-3f2a9c0d1e4b5a6c"'}}
+_category_cache = TTLCache(maxsize=1, ttl=300)
+
+def _get_categories(db: Session) -> dict:
+    """
+    Get every category (cached), with lookups by name and by id.
+    
+    RETURNS: {"rows": [...], "by_name": {...}, "by_id": {...}, "etag": ...}
+    as described above (the ETag is a hash of the rows, so it only changes
+    when a category does)
+    """
+    categories = _category_cache.get("all")
+    if categories is None:
+        rows = [{"id": c.id, "name": c.name} for c in db.query(Category).order_by(Category.id)]
+        rows_hash = hashlib.sha256(repr([(row["id"], row["name"]) for row in rows]).encode()).hexdigest()[:16]
+        categories = {
+            "rows": rows,
+            "by_name": {row["name"]: row["id"] for row in rows},
+            "by_id": {row["id"]: row["name"] for row in rows},
+            "etag": f'W/"c-{rows_hash}"',
+        }
+        _category_cache.set("all", categories)
+    return categories
+
+def _get_university(db: Session, university_id: int) -> Optional[dict]:
+    """
+    Get a university's id/name/domain, from the cache when possible.
+    
+    RETURNS: A plain dict (safe to use after the session closes), or None
+    if the university doesn't exist
+    """
+    university = _university_cache.get(university_id)
+    if university is None:
+        row = db.get(University, university_id)
+        if row is None:
+            return None
+        university = {"id": row.id, "name": row.name, "domain": row.domain}
+        _university_cache.set(university_id, university)
+    return university
+
+def _user_out(user: Union[User, CurrentUser]) -> UserResponse:
+    """
+    Convert a User (or a CurrentUser copy) to the public profile sent by the API.
+    
+    Every endpoint that returns a user goes through this (or through
+    response_model=UserResponse), so password_hash can't leak by accident
+    and the field list lives in one place: the UserResponse schema.
+    """
+    return UserResponse.model_validate(user)
 
 # =============================================================================
 # AUTHENTICATION ENDPOINTS
 # =============================================================================
 
+def _insert_user(db: Session, values: dict) -> bool:
+    """
+    Insert a new user, skipping it if the username or email is already taken.
+    
+    RETURNS: True if the user was created, False if it already existed
+    
+    HOW IT WORKS (1 statement + commit):
+    INSERT ... ON CONFLICT DO NOTHING RETURNING id
+    - The unique indexes on users (username, email, lower(username),
+      lower(email)) decide whether the account already exists, so there's no
+      separate "does it exist?" SELECT first
+    - Two people signing up with the same email at the same moment can't
+      both get past a check: the database lets exactly one INSERT through,
+      the other gets no row back (a 409, instead of a crash on commit)
+    """
+    new_user_id = db.execute(
+        upsert_insert(User).values(**values).on_conflict_do_nothing().returning(User.id)
+    ).scalar()
+    db.commit()
+    return new_user_id is not None
+
+def _registration_conflict(db: Session, username: str, email: str) -> str:
+    """Error message for a registration that clashed with an existing user."""
+    username_taken = db.query(User.id).filter(
+        func.lower(User.username) == username.lower()
+    ).first()
+    return "Username already exists" if username_taken else "Email already exists"
+
 @app.post("/api/auth/register", status_code=status.HTTP_201_CREATED)
-def register(user_data: UserRegister, db: Session = Depends(get_db)):
+async def register(user_data: UserRegister, db: Session = Depends(get_db)):
     """
     Register a new user account.
     
@@ -200,61 +380,78 @@ def register(user_data: UserRegister, db: Session = Depends(get_db)):
     2. Email must not already exist
     3. University must exist in database
     4. Email must match university domain (e.g., @bazeuniversity.edu.ng)
-    5. Password length validated by Pydantic (6-72 chars)
+    5. Password length validated by Pydantic (6-256 chars)
     
     WHAT IT DOES:
-    1. Check if username/email already registered
-    2. Get university and validate it exists
-    3. Validate email domain matches university
-    4. Hash password with bcrypt
-    5. Create new User in database
-    6. Return success message
-    """
-    # Check if username or email already exists
-    existing_user = db.query(User).filter(
-        or_(User.username == user_data.username, User.email == user_data.email)
-    ).first()
-    
-    if existing_user:
-        if existing_user.username == user_data.username:
-            raise HTTPException(status_code=409, detail="Username already exists")
-        if existing_user.email == user_data.email:
-            raise HTTPException(status_code=409, detail="Email already exists")
-    
-    # Get university from database and validate it exists
-    university = db.query(University).filter(University.id == user_data.universityId).first()
+    1. Get university and validate it exists
+    2. Validate email domain matches university
+    3. Hash password with bcrypt (on the bcrypt thread pool)
+    4. Create new User in database, unless the username/email is already
+       registered (ignoring capital letters, the email is stored in
+       lowercase) - one INSERT, see _insert_user
+    5. Return success message (or 409 if the username/email was taken)
+    
+    WHY ASYNC?
+    bcrypt is slow on purpose. Awaiting it on a dedicated pool means this
+    request waits without holding one of FastAPI's shared worker threads.
+    Database calls are blocking, so they go through run_in_threadpool.
+    """
+    # Emails are case-insensitive: store and compare them in lowercase.
+    # Usernames keep the capitals the user typed, but "JohnDoe" and "johndoe"
+    # still count as the same name (see the lower() indexes in models.py)
+    email = user_data.email.strip().lower()
+    
+    # Get university (cached - usually no database query) and validate it exists
+    university = _university_cache.get(user_data.universityId)
+    if university is None:
+        university = await run_in_threadpool(_get_university, db, user_data.universityId)
     if not university:
         raise HTTPException(status_code=400, detail="Invalid university")
     
     # Validate email domain matches university
-    # For Baze University, email must end with @bazeuniversity.edu.ng
-    if university.id == 1:
-        if not user_data.email.endswith(f"@{university.domain}"):
-            raise HTTPException(
-                status_code=400,
-                detail=f"Email must end with @{university.domain} for {university.name}"
-            )
+    # (e.g. for Baze University the email must end with @bazeuniversity.edu.ng)
+    suffix = f"@{university['domain'].lower()}"
+    if not email.endswith(suffix):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Email must end with {suffix} for {university['name']}"
+        )
     
     # Hash the password using bcrypt (one-way encryption)
-    hashed_password = get_password_hash(user_data.password)
-    
-    # Create new User object with hashed password
-    new_user = User(
-        full_name=user_data.fullName,
-        username=user_data.username,
-        email=user_data.email,
-        password_hash=hashed_password,  # Store hash, not plain password!
-        university_id=user_data.universityId
-    )
-    
-    # Add to database and save
-    db.add(new_user)
-    db.commit()
+    hashed_password = await get_password_hash_async(user_data.password)
+    
+    # Save the new user - unless the username/email is already taken
+    created = await run_in_threadpool(_insert_user, db, {
+        "full_name": user_data.fullName,
+        "username": user_data.username,
+        "email": email,                    # Lowercase (see above)
+        "password_hash": hashed_password,  # Store hash, not plain password!
+        "university_id": user_data.universityId,
+    })
+    if not created:
+        # Only now look up which of the two was taken, for the error message
+        detail = await run_in_threadpool(_registration_conflict, db, user_data.username, email)
+        raise HTTPException(status_code=409, detail=detail)
     
     return {"message": "User registered successfully."}
 
+def _replace_password_hash(db: Session, user_id: int, old_hash: str, new_hash: str) -> None:
+    """
+    Store a re-made password hash (blocking database work).
+    
+    Only replaces old_hash: if the password was changed in the meantime,
+    the newer hash is left alone.
+    """
+    db.execute(
+        update(User)
+        .where(User.id == user_id, User.password_hash == old_hash)
+        .values(password_hash=new_hash)
+    )
+    db.commit()
+    invalidate_user_cache(user_id)  # Cached copies still hold the old hash
+
 @app.post("/api/auth/login", response_model=LoginResponse)
-def login(credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(credentials: UserLogin, db: Session = Depends(get_db)):
     """
     Login and get JWT token.
     
@@ -276,50 +473,52 @@ def login(credentials: UserLogin, db: Session = Depends(get_db)):
     
     HOW IT WORKS:
     1. Find user by email in database
-    2. Verify password with bcrypt
+    2. Verify password with bcrypt (on the bcrypt thread pool)
+       - Unknown email: checked against DUMMY_PASSWORD_HASH instead, so it
+         takes the same time and gets the same 401 as a wrong password
+         (nobody can probe which emails have accounts)
     3. If valid: Create JWT token (expires in 7 days)
+       - If the stored hash is old-style or uses a different bcrypt cost
+         than BCRYPT_COST, it's replaced with a fresh hash (once)
     4. Return token + user info to frontend
     5. Frontend stores token in localStorage
     6. Frontend includes token in Authorization header for future requests
     """
-    # Find user by email
-    user = db.query(User).filter(User.email == credentials.email).first()
-    
-    # Check if user exists
-    if not user:
-        raise HTTPException(
-            status_code=404,
-            detail="Account does not exist"
-        )
-    
-    # Check password
-    if not verify_password(credentials.password, user.password_hash):
+    # Find user by email (case-insensitive, uses the lower(email) index)
+    email = credentials.email.strip().lower()
+    user = await run_in_threadpool(db.query(User).filter(func.lower(User.email) == email).first)
+    
+    # Check password (always runs bcrypt, even if the user doesn't exist)
+    stored_hash = user.password_hash if user else DUMMY_PASSWORD_HASH
+    password_ok = await verify_password_async(credentials.password, stored_hash)
+    if not user or not password_ok:
         raise HTTPException(
             status_code=401,
-            detail="Incorrect password",
+            detail="Invalid email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
     # Create JWT token
     # Token contains userId and expires in 7 days
-    access_token = create_access_token(data={"userId": user.id})
+    # (built before the rehash below: its commit expires `user`, and reading
+    # it afterwards would run another SELECT here on the event loop)
+    access_token = create_access_token(user.id)
+    user_out = _user_out(user)
+    
+    # Upgrade the stored hash while we have the plain password
+    # (e.g. after BCRYPT_COST was lowered/raised); later logins skip this
+    if password_needs_rehash(user.password_hash):
+        new_hash = await get_password_hash_async(credentials.password)
+        await run_in_threadpool(_replace_password_hash, db, user.id, user.password_hash, new_hash)
     
     # Return token + user info
     return {
         "token": access_token,
-        "user": {
-            "id": user.id,
-            "fullName": user.full_name,
-            "email": user.email,
-            "username": user.username,
-            "bio": user.bio,
-            "profileImage": user.profile_image,
-            "phone": user.phone
-        }
+        "user": user_out
     }
 
 @app.get("/api/auth/me", response_model=UserResponse)
-def get_me(current_user: User = Depends(get_current_user)):
+def get_me(current_user: CurrentUser = Depends(get_current_user_profile)):
     """
     Get current logged-in user profile.
     
@@ -329,41 +528,36 @@ def get_me(current_user: User = Depends(get_current_user)):
     RETURNS: Current user's profile data
     
     HOW IT WORKS:
-    1. FastAPI calls get_current_user automatically
-    2. get_current_user verifies the token
-    3. Returns the User object
+    1. FastAPI calls get_current_user_profile automatically
+    2. get_current_user_profile verifies the token
+    3. Returns the user's profile (a read-only CurrentUser copy)
     4. This endpoint just formats and returns user data
     """
-    return {
-        "id": current_user.id,
-        "fullName": current_user.full_name,
-        "email": current_user.email,
-        "username": current_user.username,
-        "bio": current_user.bio,
-        "profileImage": current_user.profile_image,
-        "phone": current_user.phone
-    }
+    return _user_out(current_user)
 
 @app.get("/api/users", response_model=List[UserResponse])
-def get_all_users(db: Session = Depends(get_db)):
+def get_all_users(
+    limit: int = Query(100, ge=1, le=500),  # Users per request (capped at 500)
+    offset: int = Query(0, ge=0),  # How many users to skip
+    db: Session = Depends(get_db)
+):
     """
     Get all users (for messaging conversations).
     
-    RETURNS: List of all users (excluding password)
+    PARAMETERS:
+    - limit: How many users to return (default 100, max 500)
+    - offset: How many users to skip (for loading the next batch)
+    
+    RETURNS: List of users (excluding password)
+    
+    Only the public columns are selected, so password hashes never leave the
+    database and no User objects have to be built. The rows are converted
+    by response_model=List[UserResponse].
     """
-    users = db.query(User).all()
-    return [
-        {
-            "id": u.id,
-            "fullName": u.full_name,
-            "email": u.email,
-            "username": u.username,
-            "bio": u.bio,
-            "profileImage": u.profile_image,
-            "phone": u.phone
-        }
-        for u in users
-    ]
+    return db.query(
+        User.id, User.full_name, User.email, User.username,
+        User.bio, User.profile_image, User.phone
+    ).order_by(User.id).offset(offset).limit(limit).all()
 
 @app.get("/api/users/{user_id}", response_model=UserResponse)
 def get_user(user_id: int, db: Session = Depends(get_db)):
@@ -375,25 +569,17 @@ def get_user(user_id: int, db: Session = Depends(get_db)):
     
     RETURNS: User's profile data
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    return {
-        "id": user.id,
-        "fullName": user.full_name,
-        "email": user.email,
-        "username": user.username,
-        "bio": user.bio,
-        "profileImage": user.profile_image,
-        "phone": user.phone
-    }
+    return _user_out(user)
 
 @app.put("/api/users/{user_id}", response_model=UserResponse)
 def update_user(
     user_id: int,
     user_data: UserUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """
@@ -419,14 +605,14 @@ def update_user(
     - Cannot update email or username
     """
     # Check if user is trying to update their own profile
-    if current_user.id != user_id:
+    if current_user_id != user_id:
         raise HTTPException(
             status_code=403,
             detail="You can only update your own profile"
         )
     
     # Get the user to update
-    user = db.query(User).filter(User.id == user_id).first()
+    user = db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -440,36 +626,56 @@ def update_user(
     if user_data.avatarUrl is not None:
         user.profile_image = user_data.avatarUrl
         
-        # Check if this is a new DB-stored image (URL format: /api/images/{id})
-        # If so, we need to copy the data from the orphan image to the user record
-        if "/api/images/" in user_data.avatarUrl and user_data.avatarUrl.split("/")[-1].isdigit():
-            image_id = int(user_data.avatarUrl.split("/")[-1])
-            # Find the orphan image record
-            orphan_image = db.query(ProductImage).filter(ProductImage.id == image_id).first()
-            if orphan_image and orphan_image.image_data:
+        # Check if this is a new upload (URL format: /api/uploads/{id})
+        # If so, we need to copy the data from the upload to the user record
+        upload_id = _upload_id_from_url(user_data.avatarUrl)
+        if upload_id is not None:
+            # Find the uploaded image record
+            uploaded_image = db.get(UploadedImage, upload_id)
+            if uploaded_image:
                 # Copy data to user profile
-                user.profile_image_data = orphan_image.image_data
-                # Delete the orphan image since we copied the data
-                db.delete(orphan_image)
+                user.profile_image_data = uploaded_image.image_data
+                # Delete the upload since we copied the data
+                db.delete(uploaded_image)
     
     # Save changes to database
     db.commit()
     db.refresh(user)
     
+    # Drop the cached copy used by get_current_user_profile so it picks up the changes
+    invalidate_user_cache(user.id)
+    
     # Return updated user
-    return {
-        "id": user.id,
-        "fullName": user.full_name,
-        "email": user.email,
-        "username": user.username,
-        "bio": user.bio,
-        "profileImage": user.profile_image,
-        "phone": user.phone
-    }
+    return _user_out(user)
 
 # =============================================================================
 # PRODUCT SERIALIZATION HELPER
 # =============================================================================
+# Relationships that serialize_product() reads, loaded together with the products
+# Without these, every product costs 3 extra queries (seller, category, images)
+# when it is serialized - 300 extra queries for a page of 100 products.
+# - joinedload: seller/category are one row each, so JOIN them into the same SELECT
+# - selectinload: images are a list, so fetch them for all products in one extra
+#   SELECT ... WHERE product_id IN (...) (the Base64 image_data is not needed here)
+_PRODUCT_LOAD_OPTIONS = (
+    joinedload(Product.seller),
+    joinedload(Product.category),
+    selectinload(Product.images).defer(ProductImage.image_data),
+)
+
+# Safety net while developing (ENV=development):
+# raiseload("*") makes any OTHER relationship access on these products raise
+# an error instead of quietly running one query per product. That way a
+# serializer that starts reading a new relationship fails loudly in testing
+# (add it to _PRODUCT_LOAD_OPTIONS) rather than shipping an N+1 query.
+# Off in production, so it costs nothing there.
+if os.getenv("ENV") == "development":
+    _PRODUCT_LOAD_OPTIONS += (raiseload("*"),)
+
+def _product_query(db: Session):
+    """Start a Product query that eager-loads everything serialize_product() needs."""
+    return db.query(Product).options(*_PRODUCT_LOAD_OPTIONS)
+
 def serialize_product(product: Product) -> dict:
     """
     Convert a Product object from database to JSON-ready dictionary.
@@ -480,41 +686,172 @@ def serialize_product(product: Product) -> dict:
     WHY THIS FUNCTION?
     - Products have relationships (images, seller, category)
     - Need to convert these relationships to JSON
-    - Avoid repeating this code in multiple endpoints
+    - Only needed where extra keys are added to the result (e.g. saveCount).
+      Endpoints with response_model=ProductResponse simply return the Product
+      itself and FastAPI converts it with the same schema.
+    
+    HOW: ProductResponse reads the Product's attributes directly
+    (from_attributes), which Pydantic does in its Rust core - much faster
+    than building the nested dicts by hand in Python.
+    
+    NOTE: Load products with _product_query() (or _PRODUCT_LOAD_OPTIONS) first,
+    otherwise each relationship is fetched with its own query.
     """
-    return {
-        "id": product.id,
-        "name": product.name,
-        "description": product.description,
-        "price": product.price,
-        "location": product.location,
-        "condition": product.condition,
-        "size": product.size,
-        "color": product.color,
-        "status": product.status,
-        "createdAt": product.created_at,
-        "updatedAt": product.updated_at,
-        # Convert images relationship to list of dicts
-        "images": [
-            {
-                "id": img.id,
-                "imageUrl": img.image_url,
-                "isPrimary": img.is_primary
-            } for img in product.images
-        ],
-        # Convert seller relationship to dict
-        "seller": {
-            "id": product.seller.id,
-            "fullName": product.seller.full_name,
-            "username": product.seller.username,
-            "profileImage": product.seller.profile_image
-        },
-        # Convert category relationship to dict
-        "category": {
-            "id": product.category.id,
-            "name": product.category.name
+    return ProductResponse.model_validate(product).model_dump()
+
+def _set_product_images(db: Session, product_id: int, image_urls: List[str], replace: bool = False):
+    """
+    Attach the given images to a product using as few statements as possible.
+    
+    PARAMETERS:
+    - image_urls: Image URLs in display order (the first one is primary)
+    - replace: If True, remove the product's current images that aren't
+      in image_urls (used when editing a product)
+    
+    HOW IT WORKS:
+    1. URLs like /api/images/{id} point at this product's own stored images
+       (the edit page sends them back) - those rows are kept, only their
+       order (is_primary) is updated. Other products' images are ignored
+    2. URLs like /api/uploads/{id} are new uploads (see UploadedImage) - their
+       data is moved into product_images and the upload rows are deleted;
+       the new rows get an /api/images/{id} URL, so the image is later
+       served by its ID (a primary-key lookup)
+    3. Any other URL (legacy uploads, external links) gets a new row
+    4. Each step is ONE statement (executemany UPDATE, multi-row INSERT),
+       instead of one statement per image
+    
+    Nothing is committed here - the caller commits once at the end.
+    """
+    linked_images = {}  # {image_id: is_primary} for DB-stored images
+    uploads = {}        # {upload_id: is_primary} for new uploads
+    new_images = []     # Rows to insert for plain URLs
+    for idx, image_url in enumerate(image_urls):
+        is_primary = 1 if idx == 0 else 0  # First image is primary
+        upload_id = _upload_id_from_url(image_url)
+        # Check if this is a DB-stored image (URL format: /api/images/{id})
+        if "/api/images/" in image_url and image_url.split("/")[-1].isdigit():
+            linked_images[int(image_url.split("/")[-1])] = is_primary
+        elif upload_id is not None:
+            uploads[upload_id] = is_primary
+        else:
+            # Legacy/External URL support (e.g. Unsplash or old uploads)
+            new_images.append({"product_id": product_id, "image_url": image_url, "is_primary": is_primary})
+    
+    if replace:
+        # Unlink old images, but keep the ones that are being reused
+        # (the edit page sends back the product's existing /api/images/{id} URLs)
+        # (Core DELETE: one statement, no ORM objects or session syncing)
+        db.execute(
+            delete(ProductImage).where(
+                ProductImage.product_id == product_id,
+                ProductImage.id.notin_(linked_images)
+            ).execution_options(synchronize_session=False)
+        )
+    
+    if linked_images:
+        # Only this product's own images (unknown IDs are ignored)
+        existing_ids = [
+            row.id for row in db.query(ProductImage.id).filter(
+                ProductImage.id.in_(linked_images),
+                ProductImage.product_id == product_id
+            )
+        ]
+        if existing_ids:
+            db.execute(update(ProductImage), [
+                {
+                    "id": image_id,
+                    "image_url": f"/api/images/{image_id}",
+                    "is_primary": linked_images[image_id]
+                }
+                for image_id in existing_ids
+            ])
+    
+    if uploads:
+        # Move the uploads (unknown/already used IDs are ignored) in the
+        # order they were listed, then point each new row at its own ID
+        found = {
+            row.id: row for row in db.query(
+                UploadedImage.id, UploadedImage.image_data, UploadedImage.created_at
+            ).filter(UploadedImage.id.in_(uploads))
         }
-    }
+        moved = [found[upload_id] for upload_id in uploads if upload_id in found]
+        if moved:
+            new_ids = db.execute(
+                insert(ProductImage).returning(ProductImage.id, sort_by_parameter_order=True),
+                [
+                    {
+                        "product_id": product_id,
+                        "image_url": "/api/images/pending",  # Replaced just below
+                        "image_data": row.image_data,
+                        "is_primary": uploads[row.id],
+                        "created_at": row.created_at
+                    }
+                    for row in moved
+                ]
+            ).scalars().all()
+            db.execute(update(ProductImage), [
+                {"id": image_id, "image_url": f"/api/images/{image_id}"}
+                for image_id in new_ids
+            ])
+            db.execute(
+                delete(UploadedImage).where(UploadedImage.id.in_(found))
+                .execution_options(synchronize_session=False)
+            )
+    
+    if new_images:
+        db.execute(insert(ProductImage), new_images)
+
+def _upload_id_from_url(image_url: str) -> Optional[int]:
+    """Return the upload ID from an /api/uploads/{id} URL (None for any other URL)."""
+    prefix, _, upload_id = image_url.rpartition("/")
+    if prefix.endswith("/api/uploads") and upload_id.isdigit():
+        return int(upload_id)
+    return None
+
+# =============================================================================
+# KEYSET ("CURSOR") PAGINATION HELPERS
+# =============================================================================
+# Instead of "skip the first N products" (OFFSET, which gets slower the deeper
+# you go), the client sends back a cursor pointing at the last product it saw
+# and the query continues from there: WHERE (created_at, id) < (cursor).
+# The cursor is just "<created_at>|<id>" Base64-encoded so it is URL-safe.
+#
+# created_at is nullable (rows imported without a date): those products sort
+# after all dated ones, newest id first, and their cursor is just "|<id>".
+
+def _encode_cursor(product: Product) -> str:
+    """Build the cursor that points at this product (the last one on a page)."""
+    created_at = product.created_at.isoformat() if product.created_at else ""
+    raw = f"{created_at}|{product.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str):
+    """
+    Turn a cursor back into (created_at, id) - created_at is None for a
+    product without a date.
+    
+    Raises HTTPException 400 if the cursor was tampered with or is malformed.
+    """
+    try:
+        created_at, product_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return (datetime.fromisoformat(created_at) if created_at else None), int(product_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _after_cursor(cursor_created_at: Optional[datetime], cursor_id: int):
+    """
+    The WHERE condition for "products after this cursor" in newest-first order.
+    
+    A plain (created_at, id) < (...) comparison is never true for a NULL
+    created_at, so the undated products at the end are added explicitly.
+    """
+    if cursor_created_at is None:
+        # Already among the undated products: continue by id
+        return and_(Product.created_at.is_(None), Product.id < cursor_id)
+    return or_(
+        tuple_(Product.created_at, Product.id) < (cursor_created_at, cursor_id),
+        Product.created_at.is_(None),
+    )
 
 # =============================================================================
 # PRODUCT ENDPOINTS
@@ -531,6 +868,7 @@ def get_products(
     userId: Optional[int] = Query(None),  # Filter by seller ID (show only user's listings)
     page: int = Query(1, ge=1),  # Page number (starts at 1)
     limit: int = Query(20, ge=1, le=100),  # Results per page
+    cursor: Optional[str] = Query(None),  # "nextCursor" from the previous response
     db: Session = Depends(get_db)
 ):
     """
@@ -541,6 +879,8 @@ def get_products(
     
     SPECIAL PARAMETERS:
     ?userId=6 - Show only products from user ID 6 (for "My Listings")
+    ?cursor=... - Load the next batch after a previous response ("Load more" /
+                  infinite scroll). Only works with the default "newest" sort.
     
     RETURNS:
     {
@@ -548,39 +888,45 @@ def get_products(
         "limit": 20,
         "totalPages": 5,
         "totalResults": 100,
+        "nextCursor": "MjAyNi0...",  // null when there are no more products
         "products": [...]  // Array of product objects
     }
+    With ?cursor=, page/totalPages/totalResults are null: counting every
+    match is skipped, which keeps each batch equally fast however far the
+    user has scrolled.
     
     HOW IT WORKS:
     1. Start with query: Get all products (or user's products if userId provided)
     2. Apply filters: Search text, category, price range, condition
     3. Apply sorting: newest, price ascending, or price descending
     4. Apply pagination: Skip to correct page, limit results
-    5. Count total results and calculate total pages
+    5. Count total results (in the same query) and calculate total pages
     6. Return paginated results
     """
     # Start with all available products (not deleted/sold)
     # OR if userId is provided, show only that user's products (regardless of status)
     if userId:
-        query = db.query(Product).filter(Product.seller_id == userId)
+        query = _product_query(db).filter(Product.seller_id == userId)
     else:
-        query = db.query(Product).filter(Product.status == "available")
+        query = _product_query(db).filter(Product.status == "available")
     
-    # SEARCH FILTER: Search in name or description
+    # SEARCH FILTER: Search in name or description (case-insensitive)
+    # On PostgreSQL, ILIKE '%...%' is served by the pg_trgm indexes
+    # created in init_db (see backend/database.py)
     if q:
-        search_term = f"%{q}%"  # Add wildcards for LIKE query
+        search_term = f"%{q}%"  # Add wildcards for ILIKE query
         query = query.filter(
             or_(
-                Product.name.like(search_term),  # Search in name
-                Product.description.like(search_term)  # Search in description
+                Product.name.ilike(search_term),  # Search in name
+                Product.description.ilike(search_term)  # Search in description
             )
         )
     
     # CATEGORY FILTER: Filter by category name
     if category:
-        cat = db.query(Category).filter(Category.name == category).first()
-        if cat:
-            query = query.filter(Product.category_id == cat.id)
+        category_id = _get_categories(db)["by_name"].get(category)
+        if category_id is not None:
+            query = query.filter(Product.category_id == category_id)
     
     # PRICE FILTER: Minimum price
     if minPrice is not None:
@@ -595,22 +941,65 @@ def get_products(
         query = query.filter(Product.condition == condition)
     
     # SORTING
+    newest_first = sortBy not in ("price-asc", "price-desc")
     if sortBy == "price-asc":
         query = query.order_by(Product.price.asc())  # Cheapest first
     elif sortBy == "price-desc":
         query = query.order_by(Product.price.desc())  # Most expensive first
     else:
-        query = query.order_by(Product.created_at.desc())  # Newest first (default)
-    
-    # Count total results (before pagination)
-    total = query.count()
-    total_pages = (total + limit - 1) // limit  # Ceiling division
+        # Newest first (default)
+        # id breaks ties between products listed at the same moment, so every
+        # product has a unique position for the cursor to point at.
+        # NULLS LAST: undated products go at the end on every database
+        # (PostgreSQL would otherwise put them first, SQLite last)
+        query = query.order_by(Product.created_at.desc().nulls_last(), Product.id.desc())
+    
+    # CURSOR PAGINATION: continue after the last product of the previous batch
+    # (no OFFSET and no total count)
+    if cursor:
+        if not newest_first:
+            raise HTTPException(status_code=400, detail="cursor only works with sortBy=newest")
+        cursor_created_at, cursor_id = _decode_cursor(cursor)
+        query = query.filter(_after_cursor(cursor_created_at, cursor_id))
+        
+        # Fetch one extra row: if it exists, there is another batch after this one
+        products = query.limit(limit + 1).all()
+        has_more = len(products) > limit
+        products = products[:limit]
+        return {
+            "page": None,
+            "limit": limit,
+            "totalPages": None,
+            "totalResults": None,
+            "nextCursor": _encode_cursor(products[-1]) if has_more else None,
+            "products": products  # Converted by response_model (ProductResponse)
+        }
     
     # PAGINATION: Skip to correct page and limit results
     # Page 1: offset=0 (skip 0)
     # Page 2: offset=20 (skip 20)
     # Page 3: offset=40 (skip 40)
-    products = query.offset((page - 1) * limit).limit(limit).all()
+    # COUNT(*) OVER () adds the total number of matches (before pagination)
+    # to every row, so filters/search run once instead of once more for count()
+    rows = query.add_columns(func.count().over().label("total")) \
+        .offset((page - 1) * limit).limit(limit).all()
+    products = [row[0] for row in rows]
+    
+    # Total results: read from the rows, or count separately if the page
+    # is past the end (no rows came back to read it from)
+    if rows:
+        total = rows[0].total
+    elif page > 1:
+        total = query.count()
+    else:
+        total = 0
+    total_pages = (total + limit - 1) // limit  # Ceiling division
+    
+    # Cursor for "load more": lets the client switch to cursor pagination
+    # from here on (only for the newest-first order, see above)
+    next_cursor = None
+    if newest_first and products and page * limit < total:
+        next_cursor = _encode_cursor(products[-1])
     
     # Return paginated results
     return {
@@ -618,10 +1007,15 @@ def get_products(
         "limit": limit,
         "totalPages": total_pages,
         "totalResults": total,
-        "products": [serialize_product(p) for p in products]
+        "nextCursor": next_cursor,
+        "products": products  # Converted by response_model (ProductResponse)
     }
 
-@app.get("/api/products/top-selling/featured")
+# The top-selling ranking (product IDs + save counts), recomputed at most once a minute
+# Format: {"top": [(product_id, save_count), ...]}
+_top_selling_cache = TTLCache(maxsize=1, ttl=60)
+
+@app.get("/api/products/top-selling/featured", response_model=List[TopSellingProductResponse])
 def get_top_selling_products(db: Session = Depends(get_db)):
     """
     Get the 4 most saved products (Top Selling section)
@@ -632,6 +1026,12 @@ def get_top_selling_products(db: Session = Depends(get_db)):
     3. Sort by save count (most saved first)
     4. Return top 4 products
     
+    CACHING:
+    Steps 1-3 count over every saved item, so the resulting ranking
+    (just 4 product IDs and their counts) is cached for 60 seconds.
+    The products themselves are still loaded fresh on every request,
+    so name/price/status changes show up immediately.
+    
     URL: /api/products/top-selling/featured
     
     RETURNS: Array of top 4 products with save counts
@@ -650,38 +1050,73 @@ def get_top_selling_products(db: Session = Depends(get_db)):
     WHY THIS WORKS:
     - Products with most saves = most popular/desired
     - Reflects user interest better than artificial rankings
-    - Updates automatically as users save/unsave items
-    """
-    # Subquery: Count saves per product
-    from sqlalchemy import func
-    
-    # Query: Get products with save counts
-    # LEFT JOIN preserves products with 0 saves
-    products_with_saves = db.query(
-        Product,
-        func.count(SavedItem.id).label('save_count')
-    ).outerjoin(
-        SavedItem,
-        Product.id == SavedItem.product_id
-    ).filter(
-        Product.status == "available"  # Only show available products
-    ).group_by(
-        Product.id
-    ).order_by(
-        func.count(SavedItem.id).desc()  # Most saved first
-    ).limit(4).all()
+    - Updates automatically as users save/unsave items (within a minute)
+    """
+    ranking = _top_selling_cache.get("top")
+    if ranking is None:
+        # Subquery: Count saves per product
+        save_counts = db.query(
+            SavedItem.product_id,
+            func.count(SavedItem.id).label('save_count')
+        ).group_by(SavedItem.product_id).subquery()
+        save_count = func.coalesce(save_counts.c.save_count, 0)
+        
+        # Query: Get product IDs with save counts
+        # LEFT JOIN preserves products with 0 saves
+        ranking = [tuple(row) for row in db.query(
+            Product.id,
+            save_count
+        ).outerjoin(
+            save_counts,
+            Product.id == save_counts.c.product_id
+        ).filter(
+            Product.status == "available"  # Only show available products
+        ).order_by(
+            save_count.desc()  # Most saved first
+        ).limit(4)]
+        _top_selling_cache.set("top", ranking)
+    
+    # Load the ranked products (skipping any that stopped being available)
+    product_ids = [product_id for product_id, _ in ranking]
+    products = {
+        product.id: product
+        for product in _product_query(db).filter(
+            Product.id.in_(product_ids),
+            Product.status == "available"
+        )
+    }
     
-    # Format response with save counts
+    # Format response with save counts, in ranking order
     result = []
-    for product, save_count in products_with_saves:
-        product_dict = serialize_product(product)
-        product_dict["saveCount"] = save_count or 0
-        result.append(product_dict)
+    for product_id, save_count in ranking:
+        if product_id in products:
+            product_dict = serialize_product(products[product_id])
+            product_dict["saveCount"] = save_count or 0
+            result.append(product_dict)
     
-    return result
+    return result  # Checked and encoded by response_model (TopSellingProductResponse)
+
+def _product_etag(product: Product) -> str:
+    """
+    ETag (version tag) for a product's JSON, without building the JSON.
+    
+    A short hash of everything the response is made from: the product's
+    columns (so any edit changes it, even two edits within the same second,
+    which updated_at alone can't tell apart on SQLite), its images, and the
+    seller's name/picture. Hashing these values is much cheaper than
+    building and encoding the response.
+    Weak ETag (W/...): it identifies the same data, not the same bytes.
+    """
+    seller = product.seller
+    fingerprint = (
+        tuple(getattr(product, column.key) for column in Product.__mapper__.column_attrs),
+        tuple((image.id, image.image_url, image.is_primary) for image in product.images),
+        (seller.full_name, seller.username, seller.profile_image),
+    )
+    return f'W/"p{product.id}-{hashlib.sha256(repr(fingerprint).encode()).hexdigest()[:16]}"'
 
 @app.get("/api/products/{product_id}", response_model=ProductResponse)
-def get_product(product_id: int, db: Session = Depends(get_db)):
+def get_product(product_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """
     Get details for a single product.
     
@@ -689,19 +1124,32 @@ def get_product(product_id: int, db: Session = Depends(get_db)):
     RETURNS: Complete product object with images, seller, category
     
     ERROR: 404 if product doesn't exist
+    
+    CACHING (ETag):
+    The response carries an ETag. A browser that already has the product
+    sends it back in If-None-Match; if the product hasn't changed since, the
+    answer is an empty 304 Not Modified (no JSON built or sent).
+    "no-cache" means the browser must ask every time (so edits show up at
+    once) - but asking is cheap when the answer is 304.
     """
-    # Find product by ID
-    product = db.query(Product).filter(Product.id == product_id).first()
+    # Find product by ID (with seller, category and images)
+    product = db.get(Product, product_id, options=_PRODUCT_LOAD_OPTIONS)
     
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    return serialize_product(product)
+    etag = _product_etag(product)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    response.headers.update(headers)
+    return product  # Converted by response_model (ProductResponse)
 
 @app.post("/api/products", status_code=status.HTTP_201_CREATED, response_model=ProductResponse)
 def create_product(
     product_data: ProductCreate,
-    current_user: User = Depends(get_current_user),  # Require login
+    current_user_id: int = Depends(get_current_user_id),  # Require login
     db: Session = Depends(get_db)
 ):
     """
@@ -733,14 +1181,13 @@ def create_product(
     1. Get current user from token
     2. Validate category exists
     3. Validate 1-5 images provided
-    4. Create Product in database (seller_id = current_user.id)
+    4. Create Product in database (seller_id = current_user_id)
     5. Add ProductImage records for each image
     6. First image is marked as primary
     7. Return created product
     """
     # Validate category exists
-    category = db.query(Category).filter(Category.id == product_data.categoryId).first()
-    if not category:
+    if product_data.categoryId not in _get_categories(db)["by_id"]:
         raise HTTPException(status_code=400, detail="Invalid category")
     
     # Validate 1-5 images provided
@@ -753,7 +1200,7 @@ def create_product(
         description=product_data.description,
         price=product_data.price,
         category_id=product_data.categoryId,
-        seller_id=current_user.id,  # Set seller to current user
+        seller_id=current_user_id,  # Set seller to current user
         location="Baze University",  # All products are at Baze University (only sellers from Baze)
         condition=product_data.condition,
         size=product_data.size,
@@ -761,44 +1208,26 @@ def create_product(
         status="available"  # New products are available for sale
     )
     
-    # Save product to database
+    # Send the product INSERT now (without committing) to get its ID
     db.add(new_product)
-    db.commit()
-    db.refresh(new_product)  # Refresh to get the ID
+    db.flush()
     
-    # Add images to the product
-    for idx, image_url in enumerate(product_data.images):
-        # Check if this is a new DB-stored image (URL format: /api/images/{id})
-        if "/api/images/" in image_url and image_url.split("/")[-1].isdigit():
-            image_id = int(image_url.split("/")[-1])
-            # Find the orphan image record
-            existing_image = db.query(ProductImage).filter(ProductImage.id == image_id).first()
-            if existing_image:
-                # Link it to the product
-                existing_image.product_id = new_product.id
-                existing_image.is_primary = 1 if idx == 0 else 0
-                db.add(existing_image)
-        else:
-            # Legacy/External URL support (e.g. Unsplash or old uploads)
-            # Create a new record for it
-            product_image = ProductImage(
-                product_id=new_product.id,
-                image_url=image_url,
-                is_primary=1 if idx == 0 else 0  # First image is primary
-            )
-            db.add(product_image)
+    # Add images to the product (batched, see _set_product_images)
+    _set_product_images(db, new_product.id, product_data.images)
     
-    # Save images to database
+    # Save product and images to database in one commit
     db.commit()
-    db.refresh(new_product)
     
-    return serialize_product(new_product)
+    # Reload with seller, category and images for the response
+    new_product = db.get(Product, new_product.id, options=_PRODUCT_LOAD_OPTIONS, populate_existing=True)
+    
+    return new_product  # Converted by response_model (ProductResponse)
 
 @app.put("/api/products/{product_id}", response_model=ProductResponse)
 def update_product(
     product_id: int,
     product_data: ProductUpdate,
-    current_user: User = Depends(get_current_user),  # Require login
+    current_user_id: int = Depends(get_current_user_id),  # Require login
     db: Session = Depends(get_db)
 ):
     """
@@ -813,17 +1242,17 @@ def update_product(
     2. Check current user is the seller
     3. Update provided fields (others unchanged)
     4. If images provided: delete old ones, add new ones
-    5. Update the updated_at timestamp
+    5. updated_at is set automatically (onupdate=datetime.utcnow on the model)
     6. Return updated product
     """
     # Find product
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = db.get(Product, product_id)
     
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
     # Check authorization: user must be the seller
-    if product.seller_id != current_user.id:
+    if product.seller_id != current_user_id:
         raise HTTPException(status_code=403, detail="You can only edit your own products")
     
     # Get only the fields that were provided (not None)
@@ -837,36 +1266,13 @@ def update_product(
         if len(images) < 1 or len(images) > 5:
             raise HTTPException(status_code=400, detail="Product must have between 1 and 5 images")
         
-        # Delete old images
-        # NOTE: We should probably delete the actual image data too if we want to save space
-        # But for now, we just unlink them. A cleanup job could delete orphans later.
-        db.query(ProductImage).filter(ProductImage.product_id == product_id).delete()
-        
-        # Add new images
-        for idx, image_url in enumerate(images):
-            # Check if this is a new DB-stored image (URL format: /api/images/{id})
-            if "/api/images/" in image_url and image_url.split("/")[-1].isdigit():
-                image_id = int(image_url.split("/")[-1])
-                # Find the orphan image record
-                existing_image = db.query(ProductImage).filter(ProductImage.id == image_id).first()
-                if existing_image:
-                    # Link it to the product
-                    existing_image.product_id = product_id
-                    existing_image.is_primary = 1 if idx == 0 else 0
-                    db.add(existing_image)
-            else:
-                # Legacy/External URL support
-                product_image = ProductImage(
-                    product_id=product_id,
-                    image_url=image_url,
-                    is_primary=1 if idx == 0 else 0
-                )
-                db.add(product_image)
+        # Replace the product's images: old ones that aren't kept are deleted,
+        # kept/new DB images are re-linked and plain URLs are inserted
+        _set_product_images(db, product_id, images, replace=True)
     
     # Handle category if provided
     if "categoryId" in update_data:
-        category = db.query(Category).filter(Category.id == update_data["categoryId"]).first()
-        if not category:
+        if update_data["categoryId"] not in _get_categories(db)["by_id"]:
             raise HTTPException(status_code=400, detail="Invalid category")
         product.category_id = update_data.pop("categoryId")
     
@@ -874,19 +1280,24 @@ def update_product(
     for key, value in update_data.items():
         setattr(product, key, value)
     
-    # Update the updated_at timestamp
-    product.updated_at = datetime.utcnow()
+    # updated_at is bumped automatically whenever the product row is
+    # UPDATEd. If only the images changed the row itself isn't updated,
+    # so set it explicitly (same UTC clock as created_at).
+    if not db.is_modified(product):
+        product.updated_at = datetime.utcnow()
     
     # Save changes
     db.commit()
-    db.refresh(product)
     
-    return serialize_product(product)
+    # Reload with seller, category and images for the response
+    product = db.get(Product, product_id, options=_PRODUCT_LOAD_OPTIONS, populate_existing=True)
+    
+    return product  # Converted by response_model (ProductResponse)
 
 @app.delete("/api/products/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_product(
     product_id: int,
-    current_user: User = Depends(get_current_user),  # Require login
+    current_user_id: int = Depends(get_current_user_id),  # Require login
     db: Session = Depends(get_db)
 ):
     """
@@ -907,13 +1318,13 @@ def delete_product(
     RESULT: Product no longer appears in product listings
     """
     # Find product
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = db.get(Product, product_id)
     
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
     # Check authorization
-    if product.seller_id != current_user.id:
+    if product.seller_id != current_user_id:
         raise HTTPException(status_code=403, detail="You can only delete your own products")
     
     # Soft delete: Mark as deleted instead of removing from database
@@ -929,7 +1340,7 @@ def delete_product(
 @app.post("/api/saved-items", response_model=SavedItemResponse)
 def toggle_saved_item(
     data: SavedItemToggle,
-    current_user: User = Depends(get_current_user),  # Require login
+    current_user_id: int = Depends(get_current_user_id),  # Require login
     db: Session = Depends(get_db)
 ):
     """
@@ -944,40 +1355,51 @@ def toggle_saved_item(
     {"isSaved": true}  // true if saved, false if unsaved
     
     HOW IT WORKS:
-    1. Find if product exists
-    2. Check if already saved by this user
-    3. If saved: Delete SavedItem record (unsave)
-    4. If not saved: Create SavedItem record (save)
-    5. Return current state
-    """
-    # Validate product exists
-    product = db.query(Product).filter(Product.id == data.productId).first()
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
-    # Check if already saved
-    saved_item = db.query(SavedItem).filter(
-        and_(SavedItem.user_id == current_user.id, SavedItem.product_id == data.productId)
+    1. Try to save: INSERT a SavedItem, but only if the product exists,
+       and do nothing if this user already saved it (ON CONFLICT DO NOTHING)
+    2. If a row was inserted: it's saved now
+    3. Otherwise try to unsave: DELETE this user's SavedItem for the product
+    4. If nothing was deleted either, the product doesn't exist (404)
+    
+    WHY NOT "SELECT, then INSERT or DELETE"?
+    Two quick taps could both see "not saved" and both insert.
+    Here the unique (user_id, product_id) index decides, so there's never
+    a duplicate, and saving takes a single statement.
+    """
+    # Step 1: Save it (INSERT ... SELECT from products, so a missing product inserts nothing)
+    inserted = db.execute(
+        upsert_insert(SavedItem)
+        .from_select(
+            ["user_id", "product_id", "created_at"],
+            select(
+                literal(current_user_id), Product.id, literal(datetime.utcnow())
+            ).where(Product.id == data.productId)
+        )
+        .on_conflict_do_nothing(index_elements=["user_id", "product_id"])
+        .returning(SavedItem.id)
     ).first()
     
-    if saved_item:
-        # Already saved: Delete to unsave
-        db.delete(saved_item)
-        db.commit()
-        return {"isSaved": False}
-    else:
-        # Not saved: Create new SavedItem
-        new_saved_item = SavedItem(
-            user_id=current_user.id,
-            product_id=data.productId
-        )
-        db.add(new_saved_item)
+    if inserted:
         db.commit()
         return {"isSaved": True}
+    
+    # Step 2: Already saved - delete it to unsave
+    deleted = db.execute(
+        delete(SavedItem).where(
+            and_(SavedItem.user_id == current_user_id, SavedItem.product_id == data.productId)
+        )
+    ).rowcount
+    db.commit()
+    
+    if deleted:
+        return {"isSaved": False}
+    
+    # Step 3: Nothing inserted or deleted - the product doesn't exist
+    raise HTTPException(status_code=404, detail="Product not found")
 
 @app.get("/api/saved-items", response_model=List[ProductResponse])
 def get_saved_items(
-    current_user: User = Depends(get_current_user),  # Require login
+    current_user_id: int = Depends(get_current_user_id),  # Require login
     db: Session = Depends(get_db)
 ):
     """
@@ -988,28 +1410,93 @@ def get_saved_items(
     RETURNS: Array of product objects
     
     HOW IT WORKS:
-    1. Query all SavedItem records for current user
-    2. Extract product IDs from SavedItem records
-    3. Query all Products with those IDs
-    4. Return complete product objects
+    1. JOIN products with this user's SavedItem records (one query)
+    2. Most recently saved first
+    3. Return complete product objects
     """
-    # Get all saved item records for this user
-    saved_items = db.query(SavedItem).filter(SavedItem.user_id == current_user.id).all()
-    
-    # Extract product IDs
-    product_ids = [item.product_id for item in saved_items]
-    
-    # Query products by IDs
-    products = db.query(Product).filter(Product.id.in_(product_ids)).all()
+    # Products this user saved, newest save first
+    products = _product_query(db).join(
+        SavedItem, SavedItem.product_id == Product.id
+    ).filter(
+        SavedItem.user_id == current_user_id
+    ).order_by(
+        SavedItem.created_at.desc()
+    ).all()
     
-    return [serialize_product(p) for p in products]
+    return products  # Converted by response_model (List[ProductResponse])
 
 # =============================================================================
 # IMAGE UPLOAD ENDPOINT
 # =============================================================================
 
+# Uploads are read in pieces of this size (1 MB)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Largest accepted upload (matches the "up to 10MB" shown on the sell page)
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+
+def _sniff_image_extension(header: bytes) -> Optional[str]:
+    """
+    Work out the image format from the first bytes of a file ("magic bytes").
+    
+    RETURNS: The file extension (".jpg", ".png", ".gif" or ".webp"), or None
+    if it isn't one of the allowed image formats
+    
+    WHY? The content-type header and the filename come from the client and
+    can say anything; the file's own signature can't be faked without making
+    it a real image. So the extension is taken from here, never from the
+    uploaded filename (no user input ever ends up in a stored name).
+    """
+    if header.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if header.startswith((b"GIF87a", b"GIF89a")):
+        return ".gif"
+    if header.startswith(b"RIFF") and header[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+# Content-Type sent back for each image format (see _image_media_type)
+IMAGE_MEDIA_TYPES = {
+    ".jpg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+}
+
+def _image_media_type(image_bytes: bytes) -> str:
+    """
+    The Content-Type for a stored image, read from its own first bytes.
+    
+    Uploads are only accepted after the same check (see upload_image), so
+    the format is known without storing it in another column. Old images
+    saved before that check fall back to image/jpeg, as they always were.
+    """
+    return IMAGE_MEDIA_TYPES.get(_sniff_image_extension(image_bytes[:16]), "image/jpeg")
+
+def _save_uploaded_image(db: Session, file_content: bytes) -> int:
+    """
+    Store an uploaded image in the database (blocking work, run in a thread).
+    
+    RETURNS: The new upload's ID (used in the /api/uploads/{id} URL)
+    """
+    # Convert to Base64 for DB storage
+    image_data_b64 = base64.b64encode(file_content).decode('ascii')
+    
+    # STRATEGY:
+    # 1. Create an UploadedImage (not attached to anything yet)
+    # 2. Store the Base64 data in it
+    # 3. Return the URL /api/uploads/{id}
+    # 4. When creating a product (or setting an avatar), the data is moved there
+    new_image = UploadedImage(image_data=image_data_b64)
+    
+    db.add(new_image)
+    db.commit()
+    return new_image.id
+
 @app.post("/api/upload", response_model=UploadResponse)
-async def upload_image(file: UploadFile = File(...)):
+async def upload_image(file: UploadFile = File(...), db: Session = Depends(get_db)):
     """
     Upload a product image.
     
@@ -1017,84 +1504,107 @@ async def upload_image(file: UploadFile = File(...)):
     - file: Image file (JPG, PNG, etc.)
     
     RETURNS:
-    {"imageUrl": "/uploads/products/uuid-here.jpg"}
+    {"imageUrl": "/api/uploads/123"}
     
     FILE VALIDATION:
-    - Must be an image file (content-type starts with "image/")
-    - Not validated: File size, dimensions, etc.
+    - File contents must really be a JPEG/PNG/GIF/WebP image (magic bytes),
+      otherwise 415 error. The client's filename and content-type are ignored
+    - At most 10 MB (413 error if larger)
     
     HOW IT WORKS:
-    1. Validate file is an image
-    2. Generate unique filename (UUID + original extension)
-    3. Save file to backend/uploads/products/
-    4. Return URL to access the image
-    5. Frontend uses returned URL when creating product
+    1. Check the size (if the client sent it)
+    2. Read the file in 1 MB chunks, checking the first one is an image (awaited, so other requests keep being
+       served while a large upload is read)
+    3. Store it Base64-encoded in the uploaded_images table (not attached
+       to anything yet) - in a worker thread, since it blocks
+    4. Return the URL to access the image
+    5. Frontend uses returned URL when creating product, which moves
+       the image into the product's images (/api/images/{id})
     
     FILE STORAGE:
-    - Uploaded to: backend/uploads/products/{uuid}.{extension}
-    - Accessible at: /uploads/products/{uuid}.{extension}
-    - Not stored in database (only the URL is stored)
+    - Stored in the database (uploaded_images.image_data), not on disk,
+      so images survive redeploys on hosts with temporary disks
+    - Accessible at: /api/uploads/{id} until it is used
     """
-    # Validate file is an image
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="File must be an image")
-    
-    # Generate unique filename (still used for URL reference)
-    file_extension = file.filename.split(".")[-1]
-    unique_filename = f"{uuid.uuid4()}.{file_extension}"
-    
-    # Read file content
-    file_content = await file.read()
-    
-    # Convert to Base64 for DB storage
-    import base64
-    image_data_b64 = base64.b64encode(file_content).decode('utf-8')
-    
-    # Create a temporary ProductImage record to store the data
-    # We'll link it to a product later, or just use the ID/URL reference
-    # For now, we'll just return the URL that points to our new image serving endpoint
-    
-    # NOTE: In a perfect world, we'd save to a "TemporaryImage" table first
-    # But to keep it simple and compatible with existing flow:
-    # We will save the image data into a new table or just return the data?
-    # Actually, the current flow is: Upload -> Get URL -> Create Product with URL
-    # So we need to store this image SOMEWHERE until the product is created.
-    
-    # STRATEGY:
-    # 1. Create a ProductImage with product_id=NULL (orphan image)
-    # 2. Store the Base64 data in it
-    # 3. Return the URL /api/images/{id}
-    # 4. When creating product, we update the product_id
-    
-    new_image = ProductImage(
-        product_id=None,  # Will be linked when product is created
-        image_url=f"/api/images/{unique_filename}", # Virtual URL
-        image_data=image_data_b64,
-        is_primary=0
-    )
-    
-    db.add(new_image)
-    db.commit()
-    db.refresh(new_image)
+    # Reject oversized files straight away when the size is already known
+    too_large = HTTPException(status_code=413, detail="Image must be 10MB or smaller")
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise too_large
+    
+    # Read file content in chunks, stopping as soon as it gets too big
+    chunks = []
+    total_size = 0
+    file_extension = None
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        if not chunks:
+            # First chunk: the extension comes from the image's own bytes
+            file_extension = _sniff_image_extension(chunk[:16])
+            if file_extension is None:
+                raise HTTPException(status_code=415, detail="Only JPG, PNG, WebP and GIF images are allowed")
+        total_size += len(chunk)
+        if total_size > MAX_UPLOAD_BYTES:
+            raise too_large
+        chunks.append(chunk)
+    if not chunks:
+        raise HTTPException(status_code=400, detail="File is empty")
+    file_content = b"".join(chunks)
+    
+    # Encode and save to the database without blocking the event loop
+    upload_id = await run_in_threadpool(_save_uploaded_image, db, file_content)
     
     # Return URL to access the uploaded image from DB
-    return {"imageUrl": f"/api/images/{new_image.id}"}
+    return {"imageUrl": f"/api/uploads/{upload_id}"}
+
+# An image's contents never change once uploaded (editing a product adds new
+# image rows, it doesn't overwrite old ones), so browsers and CDNs may keep a
+# copy for a day. After that they ask again with the ETag and usually get a
+# tiny 304 answer. Not "immutable": the URL is an ID, not a hash of the
+# contents, so a deleted image's URL must eventually stop being served
+IMAGE_CACHE_HEADERS = {"Cache-Control": "public, max-age=86400"}
+
+def _image_etag(image_id: int, created_at: Optional[datetime]) -> Optional[str]:
+    """
+    ETag for a stored image: its ID plus the moment it was uploaded.
+    
+    The upload time makes the tag belong to this one upload: even if an ID
+    were ever reused (older SQLite databases did that), the new image gets a
+    different ETag, so no browser is told its old copy is still valid.
+    Old rows without an upload time get no ETag (always sent in full).
+    """
+    if created_at is None:
+        return None
+    stamp = created_at.strftime("%Y%m%d%H%M%S%f")
+    return f'"img-{image_id}-{stamp}"'
 
 @app.get("/api/images/{image_id}")
-def get_image(image_id: str, db: Session = Depends(get_db)):
+def get_image(image_id: str, request: Request, db: Session = Depends(get_db)):
     """
     Serve an image directly from the database.
     
     URL: /api/images/123 (ID) or /api/images/uuid.jpg (Legacy/Filename)
+    
+    CACHING:
+    - Cache-Control: browsers/CDNs reuse their copy for a day without asking
+    - ETag (see _image_etag): if the browser does ask again (If-None-Match),
+      answer 304 Not Modified after checking just the image's ID and upload
+      time - the image data itself isn't read from the database
     """
     # Check if it's a numeric ID (new DB images)
     if image_id.isdigit():
-        image = db.query(ProductImage).filter(ProductImage.id == int(image_id)).first()
-        if image and image.image_data:
+        # Small query first (no image data): does the image exist, and is
+        # the browser's copy still the same upload?
+        row = db.query(ProductImage.created_at, ProductImage.image_data.isnot(None)) \
+            .filter(ProductImage.id == int(image_id)).first()
+        if row is not None and row[1]:
+            etag = _image_etag(int(image_id), row.created_at)
+            headers = {**IMAGE_CACHE_HEADERS, "ETag": etag} if etag else IMAGE_CACHE_HEADERS
+            if etag and request.headers.get("if-none-match") == etag:
+                return Response(status_code=304, headers=headers)
+            
+            image_data = db.query(ProductImage.image_data).filter(ProductImage.id == int(image_id)).scalar()
             # Decode Base64 and return as response
-            import base64
-            image_bytes = base64.b64decode(image.image_data)
-            return Response(content=image_bytes, media_type="image/jpeg")
+            image_bytes = base64.b64decode(image_data)
+            return Response(content=image_bytes, media_type=_image_media_type(image_bytes), headers=headers)
             
     # If not found or not numeric, try to find by filename (for migration/compatibility)
     # This part is tricky because we stored full URLs in image_url column
@@ -1105,27 +1615,44 @@ def get_image(image_id: str, db: Session = Depends(get_db)):
     image = db.query(ProductImage).filter(ProductImage.image_url.like(f"%{image_id}%")).first()
     
     if image and image.image_data:
-        import base64
         image_bytes = base64.b64decode(image.image_data)
-        return Response(content=image_bytes, media_type="image/jpeg")
+        return Response(content=image_bytes, media_type=_image_media_type(image_bytes), headers=IMAGE_CACHE_HEADERS)
         
     # Fallback: Try to serve from disk (for non-migrated images)
     # This ensures backward compatibility during migration
     file_path = f"backend/uploads/products/{image_id}"
     if os.path.exists(file_path):
-        return FileResponse(file_path)
+        return FileResponse(file_path, headers=IMAGE_CACHE_HEADERS)
         
     # If still not found, return 404
     # raise HTTPException(status_code=404, detail="Image not found")
     # Return a placeholder instead of 404 to avoid broken UI
     return RedirectResponse(url="https://images.unsplash.com/photo-1555041469-a586c61ea9bc?q=80&w=200")
 
+@app.get("/api/uploads/{upload_id}")
+def get_uploaded_image(upload_id: int, db: Session = Depends(get_db)):
+    """
+    Serve an uploaded image that hasn't been used yet (e.g. the sell page's
+    preview of a picture before the product is created).
+    
+    URL: /api/uploads/123 (the URL returned by POST /api/upload)
+    
+    Once the image is attached to a product (or set as an avatar) it moves
+    there and this URL answers 404. Upload IDs are never reused, so a
+    browser's cached copy can't turn into someone else's image.
+    """
+    image_data = db.query(UploadedImage.image_data).filter(UploadedImage.id == upload_id).scalar()
+    if image_data is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    image_bytes = base64.b64decode(image_data)
+    return Response(content=image_bytes, media_type=_image_media_type(image_bytes), headers=IMAGE_CACHE_HEADERS)
+
 # =============================================================================
 # CATEGORY ENDPOINT
 # =============================================================================
 
 @app.get("/api/categories")
-def get_categories(db: Session = Depends(get_db)):
+def get_categories(request: Request, response: Response, db: Session = Depends(get_db)):
     """
     Get all product categories.
     
@@ -1138,9 +1665,18 @@ def get_categories(db: Session = Depends(get_db)):
     ]
     
     USED BY: Frontend to populate category dropdown filters
+    
+    Served from the in-memory category cache (no database query once warm).
+    Browsers may reuse the list for 5 minutes, then check its ETag
+    (304 Not Modified if the categories haven't changed).
     """
-    categories = db.query(Category).all()
-    return [{"id": c.id, "name": c.name} for c in categories]
+    categories = _get_categories(db)
+    headers = {"ETag": categories["etag"], "Cache-Control": "public, max-age=300"}
+    if request.headers.get("if-none-match") == categories["etag"]:
+        return Response(status_code=304, headers=headers)
+    
+    response.headers.update(headers)
+    return categories["rows"]
 
 # =============================================================================
 # REAL-TIME MESSAGING (Socket.IO)
@@ -1155,11 +1691,89 @@ def get_categories(db: Session = Depends(get_db)):
 # 4. If User B is online -> receive_message event fires immediately
 # 5. If User B is offline -> message stays in database, fetched on next connect
 
-# Dictionary to track which users are currently connected
-# Format: {user_id: socket_id}
-# Example: {1: "abc123xyz", 5: "def456uvw"}
-# Used to know if a user is online and which WebSocket to send them messages to
-connected_users = {}
+# WHO IS ONLINE?
+# Every authenticated socket joins a Socket.IO "room" named after its
+# user, e.g. "user:5". Emitting to the room reaches all of that user's
+# sockets (several tabs/devices) with ONE emit call, and an emit to an
+# empty room (user offline) simply does nothing. Socket.IO already keeps
+# track of which sockets are in which room (and removes a socket from its
+# rooms when it disconnects), so no separate user -> socket dictionary
+# is needed.
+#
+# With REDIS_URL set (several server workers), presence is ALSO recorded in
+# Redis so any worker can tell whether a user is online before publishing
+# a message for them:
+# - "presence:user:<id>" -> set of that user's socket ids
+# - "presence:sid:<sid>" -> the user id of one socket
+# Both expire after PRESENCE_TTL seconds (refreshed each time the socket
+# authenticates) so entries left behind by a crashed worker clean themselves up.
+PRESENCE_TTL = 24 * 60 * 60
+
+def _user_room(user_id) -> str:
+    """Name of the Socket.IO room holding all of a user's connections."""
+    return f"user:{user_id}"
+
+async def _record_presence(sid: str, user_id: int) -> None:
+    """Remember in Redis that this socket belongs to this user (if Redis is configured)."""
+    if redis_async is None:
+        return
+    try:
+        async with redis_async.pipeline(transaction=False) as pipe:
+            pipe.sadd(f"presence:user:{user_id}", sid)
+            pipe.expire(f"presence:user:{user_id}", PRESENCE_TTL)
+            pipe.set(f"presence:sid:{sid}", user_id, ex=PRESENCE_TTL)
+            await pipe.execute()
+    except REDIS_ERRORS:
+        pass  # Presence is only a hint; delivery still works through the room
+
+async def _forget_presence(sid: str) -> None:
+    """Remove a disconnected socket from the Redis presence data (if configured)."""
+    if redis_async is None:
+        return
+    try:
+        user_id = await redis_async.get(f"presence:sid:{sid}")
+        async with redis_async.pipeline(transaction=False) as pipe:
+            if user_id is not None:
+                pipe.srem(f"presence:user:{user_id.decode()}", sid)
+            pipe.delete(f"presence:sid:{sid}")
+            await pipe.execute()
+    except REDIS_ERRORS:
+        pass
+
+async def _may_be_online(user_id) -> bool:
+    """
+    Should a real-time event be sent to this user?
+    
+    With Redis: True only if the user has a connected socket on some worker
+    (saves publishing events nobody will receive to every worker).
+    Without Redis: always True - emitting to an empty local room costs nothing.
+    If Redis can't be reached we say True, so a message is never held back.
+    """
+    if redis_async is None:
+        return True
+    try:
+        return bool(await redis_async.exists(f"presence:user:{user_id}"))
+    except REDIS_ERRORS:
+        return True
+
+# Timestamp sent with real-time events, reused for up to 1 millisecond:
+# [time it was made (UNIX seconds), ISO-8601 string]
+_timestamp_cache = [0.0, ""]
+
+def _now_iso() -> str:
+    """
+    Current UTC time as an ISO-8601 string, e.g. "2025-11-23T12:00:00.123456".
+    
+    Same format as the REST API's timestamps (naive UTC, no "+00:00"), so the
+    frontend handles messages from both the same way.
+    Events sent within the same millisecond share one string instead of each
+    building a new datetime and formatting it.
+    """
+    now = time.time()
+    if now - _timestamp_cache[0] > 0.001:
+        _timestamp_cache[1] = datetime.fromtimestamp(now, timezone.utc).replace(tzinfo=None).isoformat()
+        _timestamp_cache[0] = now
+    return _timestamp_cache[1]
 
 @sio.event
 async def connect(sid, environ):
@@ -1175,7 +1789,7 @@ async def connect(sid, environ):
     
     WHY: Initial connection setup. Frontend will authenticate after this.
     """
-    print(f"Client connected: {sid}")
+    logger.debug("Client connected: %s", sid)
 
 @sio.event
 async def disconnect(sid):
@@ -1183,20 +1797,17 @@ async def disconnect(sid):
     Handle WebSocket disconnection from client
     
     This event fires when a user closes the browser, loses connection, or navigates away.
-    We clean up our tracking by removing them from connected_users dict.
+    Socket.IO removes the socket from its user's room by itself; we only
+    clean up the Redis presence data (when Redis is used).
     
     PARAMETERS:
     - sid: Socket.IO session ID being disconnected
     
-    PURPOSE: When user goes offline, remove them from connected_users so we don't try
+    PURPOSE: When user goes offline, stop treating them as online so we don't try
              to send them messages (they won't receive them anyway).
     """
-    # Iterate through connected_users to find which user_id has this socket_id
-    for user_id, socket_id in list(connected_users.items()):
-        if socket_id == sid:
-            # Found the user - remove them from connected list
-            del connected_users[user_id]
-    print(f"Client disconnected: {sid}")
+    await _forget_presence(sid)
+    logger.debug("Client disconnected: %s", sid)
 
 @sio.event
 async def authenticate(sid, data):
@@ -1212,20 +1823,29 @@ async def authenticate(sid, data):
     
     WHAT HAPPENS:
     1. Frontend emits authenticate with user ID
-    2. Backend stores: connected_users[5] = sid
+    2. The socket joins room "user:5" (and Redis records it, if used)
     3. Now we know User 5 is online
-    4. When someone sends User 5 a message, we can emit it to their socket
+    4. When someone sends User 5 a message, we emit it to room "user:5"
     
     EXAMPLE:
     User 5 opens browser:
     - connect event -> sid = "abc123xyz"
-    - authenticate event -> connected_users[5] = "abc123xyz"
-    - Now messages to User 5 are sent to socket "abc123xyz"
+    - authenticate event -> socket "abc123xyz" joins room "user:5"
+    - Now messages to User 5 are sent to every socket in room "user:5"
     """
     user_id = data.get('userId')  # Extract user_id from the event data
     if user_id:
-        # Map this user to their WebSocket connection
-        connected_users[user_id] = sid
+        # If this socket was authenticated as another user before, leave
+        # that user's room (and stop counting it as their socket)
+        new_room = _user_room(user_id)
+        for room in sio.rooms(sid):
+            if room.startswith("user:") and room != new_room:
+                await sio.leave_room(sid, room)
+                await _forget_presence(sid)
+        
+        # Join this user's room (left automatically on disconnect)
+        await sio.enter_room(sid, new_room)
+        await _record_presence(sid, user_id)
         # Send confirmation back to client that authentication succeeded
         await sio.emit('authenticated', {'status': 'ok', 'userId': user_id}, to=sid)
 
@@ -1247,9 +1867,10 @@ async def send_message(sid, data):
       }
     
     LOGIC:
-    1. Check if receiver is in connected_users (online?)
-    2. If YES: Send receive_message event to their socket immediately
-    3. If NO: Do nothing - message is already saved to database via REST API
+    1. Emit receive_message to the receiver's room ("user:<id>")
+    2. If they're online, every socket they have open gets it immediately
+    3. If not, the room is empty and nothing is sent - the message is
+       already saved to database via REST API
     
     WHY TWO METHODS?
     - Socket.IO: Instant delivery to online users (real-time)
@@ -1265,16 +1886,14 @@ async def send_message(sid, data):
     content = data.get('content')         # What message says
     sender_id = data.get('senderId')      # Who sent it
     
-    # Check if receiver is currently connected (online)
-    if receiver_id in connected_users:
-        # Receiver is online! Get their socket ID
-        receiver_sid = connected_users[receiver_id]
-        # Send the message immediately via WebSocket
+    # Send the message immediately via WebSocket to all of the receiver's
+    # connections (skipped if they're offline)
+    if await _may_be_online(receiver_id):
         await sio.emit('receive_message', {
             'senderId': sender_id,
             'content': content,
-            'timestamp': datetime.utcnow().isoformat()
-        }, to=receiver_sid)
+            'timestamp': _now_iso()
+        }, room=_user_room(receiver_id))
     
     # Send confirmation back to sender that message was processed
     await sio.emit('message_sent', {'status': 'success'}, to=sid)
@@ -1283,10 +1902,103 @@ async def send_message(sid, data):
 # MESSAGE REST API ENDPOINTS
 # =============================================================================
 
+def _conversation_pair(user_id: int, other_user_id: int) -> tuple:
+    """
+    The (user_a_id, user_b_id) key of the conversation between two users
+    (smaller ID first - see the Conversation model).
+    """
+    return (user_id, other_user_id) if user_id < other_user_id else (other_user_id, user_id)
+
+def _record_conversation_message(db: Session, message) -> None:
+    """
+    Update the conversation summary for a newly saved message.
+    
+    message: anything with .id, .sender_id and .receiver_id (e.g. the row
+    returned by the INSERT in _save_message)
+    
+    ONE "INSERT ... ON CONFLICT DO UPDATE" statement: the first message
+    between two users creates their Conversation row, later ones update it.
+    The database does the +1 itself, so two messages sent at the same
+    moment can't overwrite each other's count.
+    """
+    if message.sender_id == message.receiver_id:
+        return  # Messages to yourself don't show up in the inbox
+    
+    user_a_id, user_b_id = _conversation_pair(message.sender_id, message.receiver_id)
+    # Which side's unread count goes up: the receiver's
+    receiver_is_a = message.receiver_id == user_a_id
+    unread_column = "unread_count_a" if receiver_is_a else "unread_count_b"
+    
+    db.execute(
+        upsert_insert(Conversation)
+        .values(
+            user_a_id=user_a_id,
+            user_b_id=user_b_id,
+            last_message_id=message.id,
+            unread_count_a=1 if receiver_is_a else 0,
+            unread_count_b=0 if receiver_is_a else 1,
+        )
+        .on_conflict_do_update(
+            index_elements=["user_a_id", "user_b_id"],
+            set_={
+                "last_message_id": message.id,
+                unread_column: getattr(Conversation, unread_column) + 1,
+            }
+        )
+    )
+
+def _save_message(db: Session, sender_id: int, message_data: MessageCreate):
+    """
+    Verify the receiver exists and save a new message (blocking database work).
+    
+    RETURNS: The saved message as a row (id, sender_id, receiver_id, content,
+    created_at, is_read)
+    RAISES: 404 if the receiver doesn't exist
+    
+    HOW IT WORKS (2 statements + commit):
+    1. INSERT ... SELECT ... FROM users WHERE id = receiver RETURNING ...
+       - Inserts the message only if the receiver exists (so a message can't
+         be saved for a non-existent user), no separate SELECT needed
+       - RETURNING sends back the new row (ID, timestamp, ...) in the same
+         round trip, so nothing has to be re-read after the commit
+    2. Update the conversation summary (see _record_conversation_message)
+    """
+    # Step 1: Save the message, but only if the receiver exists
+    new_message = db.execute(
+        insert(Message)
+        .from_select(
+            ["sender_id", "receiver_id", "content", "is_read", "created_at"],
+            select(
+                literal(sender_id),              # Who is sending this
+                User.id,                         # Who receives this
+                literal(message_data.content),   # What the message says
+                literal(0),                      # 0 = unread
+                literal(datetime.utcnow())       # When it was sent
+            ).where(User.id == message_data.receiverId)
+        )
+        .returning(
+            Message.id, Message.sender_id, Message.receiver_id,
+            Message.content, Message.created_at, Message.is_read
+        )
+    ).first()
+    
+    # No row inserted = the receiver doesn't exist
+    if new_message is None:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Receiver not found")
+    
+    # Step 2: Update the conversation summary in the same transaction
+    # (create the row for a first message, otherwise bump it): this is now
+    # the last message, and the receiver has one more unread message
+    _record_conversation_message(db, new_message)
+    
+    db.commit()               # Write to database (PERMANENT)
+    return new_message
+
 @app.post("/api/messages", response_model=MessageResponse)
 async def send_message_api(
     message_data: MessageCreate,
-    current_user: User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """
@@ -1311,7 +2023,7 @@ async def send_message_api(
     
     PARAMETERS:
     - message_data: MessageCreate schema from request body
-    - current_user: Extracted from JWT token (who is sending)
+    - current_user_id: Extracted from JWT token (who is sending)
     - db: Database session for queries
     
     RETURNS (JSON):
@@ -1337,43 +2049,26 @@ async def send_message_api(
     - Instant delivery if recipient is online (Socket.IO)
     - Fetch from database if recipient is offline
     """
-    # Step 1: Verify the receiver exists before saving message
-    # This prevents saving messages to non-existent users
-    receiver = db.query(User).filter(User.id == message_data.receiverId).first()
-    if not receiver:
-        raise HTTPException(status_code=404, detail="Receiver not found")
-    
-    # Step 2: Create new Message object
-    # Message is not saved yet - just created in Python
-    new_message = Message(
-        sender_id=current_user.id,        # Who is sending this
-        receiver_id=message_data.receiverId,  # Who receives this
-        content=message_data.content,     # What the message says
-        # is_read defaults to 0 (unread) in the database model
-    )
-    
-    # Step 3: Save message to database
-    db.add(new_message)       # Add to session
-    db.commit()               # Write to database (PERMANENT)
-    db.refresh(new_message)   # Reload to get timestamp from database
+    # Steps 1-3: Verify receiver and save the message (one INSERT ... RETURNING)
+    # Database calls block, so they run in FastAPI's thread pool
+    # (this endpoint is async because of the Socket.IO emit below)
+    new_message = await run_in_threadpool(_save_message, db, current_user_id, message_data)
     
     # Step 4: Send real-time notification via Socket.IO if receiver is online
-    # Check if receiver is in connected_users dictionary
-    if message_data.receiverId in connected_users:
-        # Receiver is online! Get their socket connection ID
-        receiver_socket_id = connected_users[message_data.receiverId]
-        
-        # Emit 'receive_message' event to their socket immediately
-        # This makes message appear instantly if they're viewing chat
+    # Emit 'receive_message' to the receiver's room: every socket they have
+    # open gets it immediately (makes message appear instantly if they're
+    # viewing chat). If they're offline nothing is sent - they'll fetch
+    # message later when they connect
+    if await _may_be_online(message_data.receiverId):
         await sio.emit('receive_message', {
-            'senderId': current_user.id,
+            'senderId': current_user_id,
             'content': message_data.content,
-            'timestamp': new_message.created_at.isoformat()
-        }, to=receiver_socket_id)
-    # If receiver is offline, do nothing - they'll fetch message later when they connect
+            'timestamp': new_message.created_at.isoformat()  # Same time as saved
+        }, room=_user_room(message_data.receiverId))
     
     # Step 5: Return the saved message to frontend
     # Frontend uses this to display the message in the chat
+    # (checked and encoded by response_model=MessageResponse)
     return {
         "id": new_message.id,
         "senderId": new_message.sender_id,
@@ -1383,10 +2078,26 @@ async def send_message_api(
         "isRead": new_message.is_read  # Will be 0 (unread)
     }
 
+# The conversation query is built ONCE here with named placeholders (:me and
+# :them) instead of on every request. SQLAlchemy then only has to fill in the
+# two IDs - it doesn't rebuild the expression or work out its cache key
+# again each call, and the compiled SQL stays in the engine's statement cache.
+_conversation_messages_stmt = select(
+    Message.id, Message.sender_id, Message.receiver_id,
+    Message.content, Message.created_at, Message.is_read
+).where(
+    or_(
+        # Messages I (current_user) sent to user_id
+        and_(Message.sender_id == bindparam("me"), Message.receiver_id == bindparam("them")),
+        # Messages from user_id sent to me (current_user)
+        and_(Message.sender_id == bindparam("them"), Message.receiver_id == bindparam("me"))
+    )
+).order_by(Message.created_at)  # Sort by timestamp (oldest first)
+
 @app.get("/api/messages/{user_id}", response_model=List[MessageResponse])
 def get_messages(
     user_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """
@@ -1408,7 +2119,7 @@ def get_messages(
     
     PARAMETERS:
     - user_id: Extracted from URL path
-    - current_user: Extracted from JWT token (who is requesting)
+    - current_user_id: Extracted from JWT token (who is requesting)
     - db: Database session for queries
     
     RETURNS (JSON): Array of message objects
@@ -1433,8 +2144,8 @@ def get_messages(
     
     DATABASE QUERY:
     Finds messages where:
-    - (sender_id = current_user.id AND receiver_id = user_id) OR
-    - (sender_id = user_id AND receiver_id = current_user.id)
+    - (sender_id = current_user_id AND receiver_id = user_id) OR
+    - (sender_id = user_id AND receiver_id = current_user_id)
     
     Then sorts by created_at (chronological order)
     
@@ -1444,20 +2155,17 @@ def get_messages(
     - This keeps read status separate from message fetching
     """
     # Step 1: Query database for all messages between the two users
-    # Use OR to get messages in both directions:
+    # Uses OR to get messages in both directions (see
+    # _conversation_messages_stmt above):
     # - Messages I sent to user_id
     # - Messages from user_id to me
-    messages = db.query(Message).filter(
-        or_(
-            # Messages I (current_user) sent to user_id
-            and_(Message.sender_id == current_user.id, Message.receiver_id == user_id),
-            # Messages from user_id sent to me (current_user)
-            and_(Message.sender_id == user_id, Message.receiver_id == current_user.id)
-        )
-    ).order_by(Message.created_at).all()  # Sort by timestamp (oldest first)
+    messages = db.execute(
+        _conversation_messages_stmt, {"me": current_user_id, "them": user_id}
+    ).all()
     
     # Step 2: Format messages as dictionaries with camelCase keys
     # (Frontend expects camelCase for consistency with other endpoints)
+    # FastAPI checks them against MessageResponse and encodes them
     return [
         {
             "id": m.id,              # Message ID
@@ -1470,62 +2178,54 @@ def get_messages(
         for m in messages
     ]
 
-@app.get("/api/conversations")
+@app.get("/api/conversations", response_model=List[ConversationResponse])
 def get_conversations(
-    current_user: User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """
     Get all conversations for the current user.
     Returns a list of users with the last message and unread count.
-    Optimized to avoid N+1 queries.
-    """
-    # Fetch all messages where current_user is sender or receiver
-    # Ordered by newest first
-    messages = db.query(Message).filter(
-        or_(
-            Message.sender_id == current_user.id,
-            Message.receiver_id == current_user.id
-        )
-    ).order_by(Message.created_at.desc()).all()
-    
-    conversations = {}
     
-    print(f"DEBUG: Current User ID: {current_user.id}")
-    
-    for msg in messages:
-        other_user_id = msg.receiver_id if msg.sender_id == current_user.id else msg.sender_id
-        
-        print(f"DEBUG: Msg ID: {msg.id}, Sender: {msg.sender_id}, Receiver: {msg.receiver_id}, Other User ID: {other_user_id}")
-        
-        if other_user_id not in conversations:
-            # Fetch user details (cache this if possible, but for now query is okay as it's per unique user)
-            # To further optimize, we could fetch all relevant users in one query
-            other_user = db.query(User).filter(User.id == other_user_id).first()
-            if not other_user:
-                print(f"DEBUG: User {other_user_id} not found")
-                continue
-                
-            conversations[other_user_id] = {
-                "id": other_user.id,
-                "fullName": other_user.full_name,
-                "username": other_user.username,
-                "profileImage": other_user.profile_image,
-                "lastMessage": msg.content,
-                "lastMessageTime": msg.created_at,
-                "unreadCount": 0
-            }
-            
-        # Count unread messages (only if I am the receiver)
-        if msg.receiver_id == current_user.id and msg.is_read == 0:
-            conversations[other_user_id]["unreadCount"] += 1
-            
-    return list(conversations.values())
+    HOW IT WORKS (1 query, however many messages there are):
+    The conversations table already holds one summary row per chat (kept up
+    to date when messages are sent/read), so we just join each of my
+    conversations with the other user's profile and the last message,
+    newest chat first.
+    """
+    # Which side of each conversation am I? (see the Conversation model)
+    i_am_a = Conversation.user_a_id == current_user_id
+    other_user_id = case((i_am_a, Conversation.user_b_id), else_=Conversation.user_a_id)
+    my_unread_count = case((i_am_a, Conversation.unread_count_a), else_=Conversation.unread_count_b)
+    
+    rows = db.query(
+        User.id, User.full_name, User.username, User.profile_image,
+        Message.content, Message.created_at, my_unread_count.label("unread_count")
+    ).select_from(Conversation) \
+        .join(User, User.id == other_user_id) \
+        .join(Message, Message.id == Conversation.last_message_id) \
+        .filter(or_(Conversation.user_a_id == current_user_id, Conversation.user_b_id == current_user_id)) \
+        .order_by(Conversation.last_message_id.desc()) \
+        .all()
+    
+    # Checked and encoded by response_model (ConversationResponse)
+    return [
+        {
+            "id": row.id,
+            "fullName": row.full_name,
+            "username": row.username,
+            "profileImage": row.profile_image,
+            "lastMessage": row.content,
+            "lastMessageTime": row.created_at,
+            "unreadCount": row.unread_count
+        }
+        for row in rows
+    ]
 
 @app.put("/api/messages/{user_id}/mark-read")
 def mark_messages_read(
     user_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """
@@ -1547,7 +2247,7 @@ def mark_messages_read(
     
     PARAMETERS:
     - user_id: Extracted from URL path
-    - current_user: Extracted from JWT token (who is marking as read)
+    - current_user_id: Extracted from JWT token (who is marking as read)
     - db: Database session for queries
     
     RETURNS (JSON):
@@ -1556,10 +2256,10 @@ def mark_messages_read(
         "message": "Marked 5 messages as read"
     }
     
-    DATABASE QUERY:
+    DATABASE QUERY (a single UPDATE):
     Finds all messages where:
     - sender_id = user_id (messages from that user)
-    - receiver_id = current_user.id (addressed to me)
+    - receiver_id = current_user_id (addressed to me)
     - is_read = 0 (currently unread)
     
     Then sets is_read = 1 for all of them
@@ -1569,22 +2269,38 @@ def mark_messages_read(
     CALL: PUT /api/messages/5/mark-read -> Marks them as read in database
     AFTER: updateMessageBadge() runs -> Counts unread -> Finds 0 -> Hides badge
     """
-    # Step 1: Find all unread messages FROM user_id TO current_user
+    # Step 1: Mark all unread messages FROM user_id TO current_user as read
     # We only mark messages as read if:
     # - They came from user_id (sender_id = user_id)
-    # - They're addressed to current_user (receiver_id = current_user.id)
+    # - They're addressed to current_user (receiver_id = current_user_id)
     # - They're currently unread (is_read = 0)
-    messages = db.query(Message).filter(
+    # One UPDATE statement does it in the database - the messages are never
+    # loaded into Python. It returns how many rows were changed.
+    marked = db.query(Message).filter(
         and_(
             Message.sender_id == user_id,              # From this user
-            Message.receiver_id == current_user.id,    # To me
+            Message.receiver_id == current_user_id,    # To me
             Message.is_read == 0                       # Currently unread
         )
-    ).all()
-    
-    # Step 2: Mark each message as read (is_read = 1)
-    for msg in messages:
-        msg.is_read = 1  # 0 = unread, 1 = read
+    ).update({Message.is_read: 1}, synchronize_session=False)  # 0 = unread, 1 = read
+    
+    # Step 2: Update my unread count in the conversation summary
+    # Not a plain "= 0": a message sent between step 1 and here is still
+    # unread, and zeroing the counter would lose it. Instead the counter is
+    # set (in the same transaction) to the number of messages from user_id
+    # that are still unread - normally 0. Uses the
+    # (receiver_id, sender_id, is_read) index, so it's a quick count.
+    user_a_id, user_b_id = _conversation_pair(current_user_id, user_id)
+    unread_column = Conversation.unread_count_a if current_user_id == user_a_id else Conversation.unread_count_b
+    still_unread = select(func.count()).select_from(Message).where(
+        Message.receiver_id == current_user_id,
+        Message.sender_id == user_id,
+        Message.is_read == 0
+    ).scalar_subquery()
+    db.query(Conversation).filter(
+        Conversation.user_a_id == user_a_id,
+        Conversation.user_b_id == user_b_id
+    ).update({unread_column: still_unread}, synchronize_session=False)
     
     # Step 3: Commit changes to database (PERMANENT)
     db.commit()
@@ -1592,7 +2308,7 @@ def mark_messages_read(
     # Step 4: Return success response
     return {
         "status": "success",
-        "message": f"Marked {len(messages)} messages as read"
+        "message": f"Marked {marked} messages as read"
     }
 
 # =============================================================================
@@ -1603,12 +2319,12 @@ def mark_messages_read(
 def create_comment(
     product_id: int,
     comment_data: CommentCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user_profile),
     db: Session = Depends(get_db)
 ):
     """Create a new comment on a product"""
     # Check if product exists
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = db.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
@@ -1629,15 +2345,7 @@ def create_comment(
         "authorId": new_comment.author_id,
         "content": new_comment.content,
         "createdAt": new_comment.created_at,
-        "author": {
-            "id": current_user.id,
-            "fullName": current_user.full_name,
-            "username": current_user.username,
-            "email": current_user.email,
-            "bio": current_user.bio,
-            "profileImage": current_user.profile_image,
-            "phone": current_user.phone
-        }
+        "author": _user_out(current_user)
     }
 
 @app.get("/api/products/{product_id}/comments", response_model=List[CommentResponse])
@@ -1646,41 +2354,31 @@ def get_comments(
     db: Session = Depends(get_db)
 ):
     """Get all comments for a product"""
-    comments = db.query(Comment).filter(Comment.product_id == product_id).order_by(Comment.created_at.desc()).all()
+    # joinedload: fetch each comment's author in the same query
+    # (instead of one extra query per comment)
+    comments = db.query(Comment).options(joinedload(Comment.author)) \
+        .filter(Comment.product_id == product_id).order_by(Comment.created_at.desc()).all()
     
-    return [
-        {
-            "id": c.id,
-            "productId": c.product_id,
-            "authorId": c.author_id,
-            "content": c.content,
-            "createdAt": c.created_at,
-            "author": {
-                "id": c.author.id,
-                "fullName": c.author.full_name,
-                "username": c.author.username,
-                "email": c.author.email,
-                "bio": c.author.bio,
-                "profileImage": c.author.profile_image,
-                "phone": c.author.phone
-            }
-        }
-        for c in comments
-    ]
+    return comments  # Converted by response_model (List[CommentResponse])
 
 @app.delete("/api/comments/{comment_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_comment(
     comment_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """Delete a comment (only author or seller can delete)"""
-    comment = db.query(Comment).filter(Comment.id == comment_id).first()
+    # joinedload: fetch the comment's product (just its seller_id) in the
+    # same query, since the permission check below needs it
+    comment = db.get(
+        Comment, comment_id,
+        options=[joinedload(Comment.product).load_only(Product.seller_id)]
+    )
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
     
     # Check if current user is the author or the product seller
-    if comment.author_id != current_user.id and comment.product.seller_id != current_user.id:
+    if comment.author_id != current_user_id and comment.product.seller_id != current_user_id:
         raise HTTPException(status_code=403, detail="You can only delete your own comments")
     
     db.delete(comment)
@@ -1691,19 +2389,51 @@ def delete_comment(
 # FRONTEND ROUTES (SERVE HTML)
 # =============================================================================
 
+# The HTML pages are small and only change when the app is redeployed, so
+# they're read into memory once at startup instead of opening the file on
+# every request. Each page gets an ETag (a short hash of its contents):
+# a browser that already has the page sends it back in If-None-Match and
+# gets an empty 304 Not Modified answer instead of the whole page.
+# Format: {"login": (b"<!DOCTYPE html>...", '"3f2a9c0d1e4b5a6c"'), ...}
+
+# Names of the pages that exist (e.g. "index", "login"), fixed at startup.
+# A frozenset answers "is this a real page?" with one hash lookup, so
+# requests for unknown pages (or tricks like "../secret") are rejected
+# without touching the filesystem.
+HTML_PAGES = frozenset(
+    filename[:-5] for filename in os.listdir(".") if filename.endswith(".html")
+)
+
+def _read_html_page(page_name: str) -> tuple:
+    """Read one page from disk: returns (bytes, etag)."""
+    with open(f"{page_name}.html", "rb") as f:
+        data = f.read()
+    return data, f'"{hashlib.blake2b(data, digest_size=8).hexdigest()}"'
+
+_html_pages = {page_name: _read_html_page(page_name) for page_name in HTML_PAGES}
+
+# While developing (ENV=development), re-read the requested page on every
+# request so edits show up without restarting the server
+_RELOAD_HTML = os.getenv("ENV") == "development"
+
+def _html_response(page_name: str, request: Request) -> Response:
+    """Serve a cached HTML page (404 if there's no such page)."""
+    if page_name not in HTML_PAGES:
+        raise HTTPException(status_code=404, detail="Page not found")
+    
+    data, etag = _read_html_page(page_name) if _RELOAD_HTML else _html_pages[page_name]
+    # Browsers may reuse the page for 60 seconds, then check the ETag
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type="text/html", headers=headers)
+
 @app.get("/")
-async def read_root():
+async def read_root(request: Request):
     """Serve the homepage"""
-    return FileResponse("index.html")
+    return _html_response("index", request)
 
 @app.get("/{page_name}.html")
-async def read_html(page_name: str):
+async def read_html(page_name: str, request: Request):
     """Serve other HTML pages (e.g., login.html, products.html)"""
-    # Security check: prevent directory traversal
-    if ".." in page_name or "/" in page_name:
-        raise HTTPException(status_code=404, detail="Page not found")
-    
-    file_path = f"{page_name}.html"
-    if os.path.exists(file_path):
-        return FileResponse(file_path)
-    raise HTTPException(status_code=404, detail="Page not found")
+    return _html_response(page_name, request)
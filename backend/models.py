@@ -10,8 +10,8 @@ WHAT HAPPENS HERE:
 - Uses SQLAlchemy ORM which converts these classes to SQL tables
 """
 
-from sqlalchemy import Column, Integer, String, Float, Text, DateTime, ForeignKey, Enum, Index
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, ForeignKey, Enum, Index, desc, func, text
+from sqlalchemy.orm import deferred, relationship
 from datetime import datetime
 from backend.database import Base
 import enum
@@ -134,7 +134,10 @@ class User(Base):
     
     # Optional profile picture URL (can be NULL)
     profile_image = Column(String(500), nullable=True)
-    profile_image_data = Column(Text, nullable=True)  # Base64 encoded image data
+    # Base64 encoded image data
+    # deferred(): this blob is left out of the SELECT when a User is loaded
+    # (login, auth, listings) and only fetched if the attribute is accessed
+    profile_image_data = deferred(Column(Text, nullable=True))
     
     # Optional phone number (can be NULL)
     phone = Column(String(20), nullable=True)
@@ -154,6 +157,14 @@ class User(Base):
     # Relationship: This user has written many comments
     comments = relationship("Comment", back_populates="author")
 
+# Case-insensitive uniqueness: "John@Uni.edu" and "john@uni.edu" are the same
+# account (same for usernames). These indexes are on lower(email) and
+# lower(username), so the database itself refuses a second account that only
+# differs in capital letters, and lookups written as
+# func.lower(User.email) == "john@uni.edu" are a single index seek.
+Index('uq_users_email_lower', func.lower(User.email), unique=True)
+Index('uq_users_username_lower', func.lower(User.username), unique=True)
+
 # =============================================================================
 # CATEGORY TABLE (Product categories)
 # =============================================================================
@@ -211,6 +222,31 @@ class Product(Base):
     - saved_by: Users who saved/bookmarked it
     """
     __tablename__ = "products"
+    # Composite indexes for the filters used by the product listing
+    # (GET /api/products). The column order matters: the database can use
+    # an index for the first column(s) alone, but not for later ones alone.
+    __table_args__ = (
+        # Default listing: available products, newest first.
+        # Partial index: only "available" rows are stored in it, so it stays
+        # small (sold/deleted products never show up in the listing anyway)
+        Index(
+            'idx_product_status_created', 'status', desc('created_at'),
+            postgresql_where=text("status = 'available'"),
+            sqlite_where=text("status = 'available'"),
+        ),
+        # "My listings" page (userId filter)
+        Index('idx_product_seller_status', 'seller_id', 'status'),
+        # Category page, newest first (partial, like the default listing)
+        Index(
+            'idx_product_category_created', 'category_id', desc('created_at'),
+            postgresql_where=text("status = 'available'"),
+            sqlite_where=text("status = 'available'"),
+        ),
+        # Category page with price filter/sort
+        Index('idx_product_category_price', 'category_id', 'price'),
+        # Price filter/sort across all available products
+        Index('idx_product_status_price', 'status', 'price'),
+    )
     
     # Unique ID for each product
     id = Column(Integer, primary_key=True, index=True)
@@ -252,6 +288,9 @@ class Product(Base):
     
     # When product was last updated
     # Automatically updates to current time when product is modified
+    # Same clock as created_at (naive UTC from Python): the database's NOW()
+    # is local time on PostgreSQL and whole seconds on SQLite, which could
+    # make updatedAt come out earlier than createdAt
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationship: This product belongs to one category
@@ -290,11 +329,21 @@ class ProductImage(Base):
     """
     __tablename__ = "product_images"
     
+    # Image IDs are part of the image URL (/api/images/{id}), so an ID must
+    # never be handed out twice. SQLite normally reuses the highest ID after
+    # that row is deleted; AUTOINCREMENT stops that (PostgreSQL sequences
+    # never reuse IDs anyway)
+    __table_args__ = {"sqlite_autoincrement": True}
+    
     # Unique ID for each image
     id = Column(Integer, primary_key=True, index=True)
     
     # Foreign key: Which product does this image belong to?
-    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    # Every image belongs to a product (uploads waiting to be attached live
+    # in UploadedImage instead)
+    # index=True: every product listing loads images by product_id, and
+    # without an index that reads the whole table (image data included)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
     
     # URL where image is stored
     # Can be a local path like "/uploads/products/image123.jpg"
@@ -314,6 +363,38 @@ class ProductImage(Base):
     # Store the actual image data (Base64 encoded string)
     image_data = Column(Text, nullable=True)
 
+# =============================================================================
+# UPLOADED IMAGES TABLE (uploads not attached to anything yet)
+# =============================================================================
+class UploadedImage(Base):
+    """
+    An image that was uploaded (POST /api/upload) but not used yet.
+    
+    The sell/edit pages upload each image first and only later send the
+    returned URL (/api/uploads/{id}) with the product; the edit-profile page
+    does the same for avatars. Until then the image belongs to nothing, so
+    it waits here instead of in product_images (where product_id is required).
+    When it is used, its data is moved to the product/user and the row is deleted.
+    
+    COLUMNS:
+    - id: Primary key (part of the /api/uploads/{id} URL)
+    - image_data: The image itself (Base64 encoded string)
+    - created_at: When image was uploaded
+    """
+    __tablename__ = "uploaded_images"
+    
+    # IDs are part of the URL, so never reuse them (see ProductImage)
+    __table_args__ = {"sqlite_autoincrement": True}
+    
+    # Unique ID for each upload
+    id = Column(Integer, primary_key=True)
+    
+    # Store the actual image data (Base64 encoded string)
+    image_data = Column(Text, nullable=False)
+    
+    # When image was uploaded
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 # =============================================================================
 # SAVED ITEMS TABLE (Bookmarks/Wishlist)
 # =============================================================================
@@ -333,6 +414,11 @@ class SavedItem(Base):
     - product: Which product was saved
     """
     __tablename__ = "saved_items"
+    __table_args__ = (
+        # A user can save a product only once. Also speeds up
+        # "which products has this user saved?" (the saved items page)
+        Index('uq_saved_items_user_product', 'user_id', 'product_id', unique=True),
+    )
     
     # Unique ID for each saved item
     id = Column(Integer, primary_key=True, index=True)
@@ -374,7 +460,12 @@ class Message(Base):
     """
     __tablename__ = "messages"
     __table_args__ = (
-        Index('idx_messages_sender_receiver', 'sender_id', 'receiver_id'),
+        # One chat between two users, in time order (get_messages looks up
+        # both directions: A->B and B->A). Also covers lookups by the
+        # (sender_id, receiver_id) pair alone.
+        Index('idx_messages_sender_receiver_created', 'sender_id', 'receiver_id', 'created_at'),
+        # Unread messages from one user to me (unread counts, mark-as-read)
+        Index('idx_messages_receiver_sender_read', 'receiver_id', 'sender_id', 'is_read'),
         Index('idx_messages_receiver_id', 'receiver_id'),
         Index('idx_messages_is_read', 'is_read'),
     )
@@ -403,6 +494,54 @@ class Message(Base):
     # Relationship: Receiver user
     receiver = relationship("User", foreign_keys=[receiver_id])
 
+# =============================================================================
+# CONVERSATION TABLE (Summary of each chat, for the inbox)
+# =============================================================================
+class Conversation(Base):
+    """
+    One row per pair of users who have messaged each other.
+    Keeps the inbox summary (last message + unread counts) up to date, so the
+    conversation list doesn't have to go through every message each time.
+    
+    The pair is always stored in the same order: user_a_id is the SMALLER
+    user ID and user_b_id the larger one. That way a chat between users 7
+    and 3 is always the row (3, 7), whoever sent the last message.
+    
+    COLUMNS:
+    - id: Primary key
+    - user_a_id: The user with the smaller ID
+    - user_b_id: The user with the larger ID
+    - last_message_id: The newest message in this chat
+    - unread_count_a: Messages user A hasn't read yet (sent by user B)
+    - unread_count_b: Messages user B hasn't read yet (sent by user A)
+    
+    KEPT UP TO DATE BY:
+    - Sending a message: sets last_message_id, +1 unread for the receiver
+    - Marking a chat as read: recounts the reader's unread messages (normally 0)
+    (see backend/main.py)
+    """
+    __tablename__ = "conversations"
+    __table_args__ = (
+        # One row per pair (also used to find "my" chats as user A)
+        Index('uq_conversations_user_a_user_b', 'user_a_id', 'user_b_id', unique=True),
+        # Find "my" chats as user B
+        Index('idx_conversations_user_b', 'user_b_id'),
+    )
+    
+    # Unique ID for each conversation
+    id = Column(Integer, primary_key=True)
+    
+    # The two users (user_a_id < user_b_id)
+    user_a_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_b_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    
+    # The newest message between them
+    last_message_id = Column(Integer, ForeignKey("messages.id"), nullable=False)
+    
+    # How many messages each side hasn't read yet
+    unread_count_a = Column(Integer, nullable=False, default=0)
+    unread_count_b = Column(Integer, nullable=False, default=0)
+
 # =============================================================================
 # COMMENT TABLE (Product Comments/Questions)
 # =============================================================================
@@ -423,6 +562,10 @@ class Comment(Base):
     - author: The user who wrote the comment
     """
     __tablename__ = "comments"
+    __table_args__ = (
+        # A product's comments, newest first (get_comments)
+        Index('idx_comments_product_created', 'product_id', 'created_at'),
+    )
     
     # Unique ID for each comment
     id = Column(Integer, primary_key=True, index=True)
@@ -24,7 +24,7 @@ HOW IT WORKS:
 6. FastAPI converts back to JSON and sends to client
 """
 
-from pydantic import BaseModel, EmailStr, Field, field_validator
+from pydantic import AliasChoices, BaseModel, EmailStr, Field, field_validator
 from typing import Optional, List
 from datetime import datetime
 
@@ -42,14 +42,14 @@ class UserRegister(BaseModel):
     - fullName: User's full name (2-255 chars)
     - username: Unique username (3-100 chars)
     - email: Valid email address (must use university domain)
-    - password: Password (6-72 chars - bcrypt limit)
+    - password: Password (6-256 chars)
     - universityId: Which university they belong to
     
     VALIDATION:
     - fullName: At least 2 characters, max 255
     - username: At least 3 characters, max 100
     - email: Must be valid email format
-    - password: Between 6-72 characters (bcrypt limitation)
+    - password: Between 6-256 characters (hashed with SHA-256 + bcrypt, so no 72-byte cut-off)
     - universityId: Must be integer
     
     EXAMPLE REQUEST:
@@ -64,7 +64,7 @@ class UserRegister(BaseModel):
     fullName: str = Field(..., min_length=2, max_length=255)  # ... = required
     username: str = Field(..., min_length=3, max_length=100)
     email: EmailStr  # EmailStr automatically validates email format
-    password: str = Field(..., min_length=6, max_length=72, description="Password must be between 6 and 72 characters (bcrypt limit)")
+    password: str = Field(..., min_length=6, max_length=256, description="Password must be between 6 and 256 characters")
     universityId: int
 
 class UserLogin(BaseModel):
@@ -84,7 +84,7 @@ class UserLogin(BaseModel):
     }
     """
     email: EmailStr
-    password: str = Field(..., max_length=72)
+    password: str = Field(..., max_length=256)
 
 class UserResponse(BaseModel):
     """
@@ -104,13 +104,19 @@ class UserResponse(BaseModel):
     from_attributes = True:
     Converts database model to Pydantic model automatically
     Without this, would need to manually create dict from User object
+    
+    validation_alias=AliasChoices("full_name", "fullName"):
+    The database model uses snake_case (user.full_name) but the API uses
+    camelCase (fullName). The alias lets the schema read either one, so an
+    endpoint can return the User object itself and Pydantic (fast, written
+    in Rust) builds the response. The JSON output still says "fullName".
     """
     id: int
-    fullName: str
+    fullName: str = Field(validation_alias=AliasChoices("full_name", "fullName"))
     email: str
     username: str
     bio: Optional[str] = None
-    profileImage: Optional[str] = None
+    profileImage: Optional[str] = Field(None, validation_alias=AliasChoices("profile_image", "profileImage"))
     phone: Optional[str] = None
     
     class Config:
@@ -181,8 +187,8 @@ class ProductImageResponse(BaseModel):
     - isPrimary: Is this the main/cover image? (1=yes, 0=no)
     """
     id: int
-    imageUrl: str
-    isPrimary: int
+    imageUrl: str = Field(validation_alias=AliasChoices("image_url", "imageUrl"))
+    isPrimary: int = Field(validation_alias=AliasChoices("is_primary", "isPrimary"))
     
     class Config:
         from_attributes = True
@@ -200,9 +206,9 @@ class SellerInfo(BaseModel):
     - profileImage: Optional seller's profile picture
     """
     id: int
-    fullName: str
+    fullName: str = Field(validation_alias=AliasChoices("full_name", "fullName"))
     username: str
-    profileImage: Optional[str] = None
+    profileImage: Optional[str] = Field(None, validation_alias=AliasChoices("profile_image", "profileImage"))
     
     class Config:
         from_attributes = True
@@ -240,8 +246,8 @@ class ProductResponse(BaseModel):
     - size: Product size (optional, for clothing)
     - color: Product color (optional)
     - status: available/sold/deleted
-    - createdAt: When product was listed
-    - updatedAt: When product was last updated
+    - createdAt: When product was listed (null if unknown)
+    - updatedAt: When product was last updated (null if unknown)
     - images: Array of product images
     - seller: Seller information
     - category: Product category
@@ -275,8 +281,10 @@ class ProductResponse(BaseModel):
     size: Optional[str] = None
     color: Optional[str] = None
     status: str
-    createdAt: datetime
-    updatedAt: datetime
+    # Aliases read the snake_case database columns (see UserResponse)
+    # Null for old rows saved without a date (the columns are nullable)
+    createdAt: Optional[datetime] = Field(None, validation_alias=AliasChoices("created_at", "createdAt"))
+    updatedAt: Optional[datetime] = Field(None, validation_alias=AliasChoices("updated_at", "updatedAt"))
     images: List[ProductImageResponse]
     seller: SellerInfo
     category: CategoryResponse
@@ -374,8 +382,12 @@ class ProductListResponse(BaseModel):
     - limit: Number of results per page
     - totalPages: Total number of pages
     - totalResults: Total number of products matching filters
+    - nextCursor: Pass as ?cursor= to get the next batch (null on the last one)
     - products: Array of ProductResponse objects
     
+    With cursor pagination (?cursor=...), page/totalPages/totalResults
+    are null because the total isn't counted.
+    
     PAGINATION EXAMPLE:
     If totalResults=100 and limit=20:
     - Page 1: results 1-20
@@ -391,15 +403,28 @@ class ProductListResponse(BaseModel):
         "limit": 20,
         "totalPages": 5,
         "totalResults": 100,
+        "nextCursor": "MjAyNi0...",
         "products": [...]  // Array of 20 ProductResponse objects
     }
     """
-    page: int
+    page: Optional[int] = None
     limit: int
-    totalPages: int
-    totalResults: int
+    totalPages: Optional[int] = None
+    totalResults: Optional[int] = None
+    nextCursor: Optional[str] = None
     products: List[ProductResponse]
 
+class TopSellingProductResponse(ProductResponse):
+    """
+    A product in the Top Selling section: ProductResponse plus its save count.
+    
+    USED BY: GET /api/products/top-selling/featured
+    
+    FIELDS (in addition to ProductResponse):
+    - saveCount: How many users saved this product
+    """
+    saveCount: int = 0
+
 # =============================================================================
 # SAVED ITEMS (BOOKMARKS) SCHEMAS
 # =============================================================================
@@ -487,6 +512,26 @@ class MessageResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class ConversationResponse(BaseModel):
+    """
+    Schema for one chat in the inbox (the other user + latest message).
+    
+    USED BY: GET /api/conversations
+    
+    FIELDS:
+    - id, fullName, username, profileImage: The other user
+    - lastMessage: Text of the newest message in the chat
+    - lastMessageTime: When it was sent
+    - unreadCount: Messages from the other user I haven't read yet
+    """
+    id: int
+    fullName: str
+    username: str
+    profileImage: Optional[str] = None
+    lastMessage: str
+    lastMessageTime: datetime
+    unreadCount: int
+
 # =============================================================================
 # COMMENT SCHEMAS (Product Comments/Questions)
 # =============================================================================
@@ -496,12 +541,12 @@ class CommentCreate(BaseModel):
     content: str
 
 class CommentResponse(BaseModel):
-    """Schema for comment response"""
+    """Schema for comment response (reads a Comment object directly, see UserResponse)"""
     id: int
-    productId: int
-    authorId: int
+    productId: int = Field(validation_alias=AliasChoices("product_id", "productId"))
+    authorId: int = Field(validation_alias=AliasChoices("author_id", "authorId"))
     content: str
-    createdAt: datetime
+    createdAt: datetime = Field(validation_alias=AliasChoices("created_at", "createdAt"))
     author: UserResponse
     
     class Config:
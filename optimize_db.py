@@ -18,9 +18,14 @@ def optimize_database():
         
         print("2. Creating indexes...")
         try:
-            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_messages_sender_receiver ON messages (sender_id, receiver_id)"))
+            # (sender_id, receiver_id, created_at) replaces the old
+            # (sender_id, receiver_id) index, which is dropped if present
+            conn.execute(text("DROP INDEX IF EXISTS idx_messages_sender_receiver"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_messages_sender_receiver_created ON messages (sender_id, receiver_id, created_at)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_messages_receiver_sender_read ON messages (receiver_id, sender_id, is_read)"))
             conn.execute(text("CREATE INDEX IF NOT EXISTS idx_messages_receiver_id ON messages (receiver_id)"))
             conn.execute(text("CREATE INDEX IF NOT EXISTS idx_messages_is_read ON messages (is_read)"))
+            conn.commit()
             print("   - Indexes created successfully.")
         except Exception as e:
             print(f"   - Error creating indexes: {e}")
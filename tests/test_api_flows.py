@@ -0,0 +1,219 @@
+"""
+API FLOW TESTS
+==============
+End-to-end checks of the main API flows, run against a throwaway SQLite
+database with FastAPI's TestClient (no server needs to be running, unlike
+test_api.py in the project root).
+
+HOW TO RUN (from the project root):
+    python -m unittest discover tests
+(pytest finds these tests too, if it is installed)
+
+WHAT IS COVERED:
+1. Register + login, including the password re-hash on login
+2. Cursor ("load more") pagination across several batches
+3. Saving / unsaving a product (the toggle)
+4. 304 Not Modified for an unchanged product (ETag)
+5. Unread message count before and after mark-read
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+# The database must be chosen BEFORE the backend is imported
+# (backend/database.py reads DATABASE_URL when it is first imported)
+_TEMP_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_TEMP_DIR.name, "test.db")
+os.environ.setdefault("BCRYPT_COST", "4")  # Cheapest cost: keeps the tests fast
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bcrypt
+from fastapi.testclient import TestClient
+
+from backend.main import app
+from backend.auth import password_needs_rehash
+from backend.database import SessionLocal
+from backend.models import User
+
+PASSWORD = "password123"
+
+
+class ApiFlowTests(unittest.TestCase):
+    """One app + database for all tests; every test makes its own users."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.client = TestClient(app)
+        cls.client.__enter__()  # Runs the startup event (creates the tables)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.__exit__(None, None, None)
+
+    # -------------------------------------------------------------------------
+    # Helpers
+    # -------------------------------------------------------------------------
+
+    def register(self, username):
+        """Register a Baze University user; returns their email."""
+        email = f"{username}@bazeuniversity.edu.ng"
+        response = self.client.post("/api/auth/register", json={
+            "fullName": username.title(),
+            "username": username,
+            "email": email,
+            "password": PASSWORD,
+            "universityId": 1,
+        })
+        self.assertEqual(response.status_code, 201, response.text)
+        return email
+
+    def login(self, email):
+        """Log in; returns (user id, Authorization headers)."""
+        response = self.client.post("/api/auth/login", json={"email": email, "password": PASSWORD})
+        self.assertEqual(response.status_code, 200, response.text)
+        data = response.json()
+        return data["user"]["id"], {"Authorization": f"Bearer {data['token']}"}
+
+    def create_product(self, headers, name):
+        """List a product; returns its ID."""
+        response = self.client.post("/api/products", headers=headers, json={
+            "name": name,
+            "description": "A product made by the tests",
+            "price": 10,
+            "categoryId": 1,
+            "images": ["/uploads/products/test.jpg"],
+            "condition": "Good",
+        })
+        self.assertEqual(response.status_code, 201, response.text)
+        return response.json()["id"]
+
+    @staticmethod
+    def stored_hash(email):
+        db = SessionLocal()
+        try:
+            return db.query(User.password_hash).filter(User.email == email).scalar()
+        finally:
+            db.close()
+
+    # -------------------------------------------------------------------------
+    # Tests
+    # -------------------------------------------------------------------------
+
+    def test_register_and_login_rehashes_password(self):
+        email = self.register("rehashuser")
+        self.assertFalse(password_needs_rehash(self.stored_hash(email)))
+
+        # Simulate an account created with an older cost (and plain bcrypt)
+        old_hash = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(5)).decode()
+        db = SessionLocal()
+        try:
+            db.query(User).filter(User.email == email).update({"password_hash": old_hash})
+            db.commit()
+        finally:
+            db.close()
+        self.assertTrue(password_needs_rehash(old_hash))
+
+        user_id, headers = self.login(email)
+        new_hash = self.stored_hash(email)
+        self.assertNotEqual(new_hash, old_hash)
+        self.assertFalse(password_needs_rehash(new_hash))
+
+        # The new hash still works, and the token is valid
+        self.login(email)
+        me = self.client.get("/api/auth/me", headers=headers)
+        self.assertEqual(me.status_code, 200, me.text)
+        self.assertEqual(me.json()["id"], user_id)
+
+        # Wrong password / wrong email domain are still refused
+        wrong = self.client.post("/api/auth/login", json={"email": email, "password": "wrong-password"})
+        self.assertEqual(wrong.status_code, 401)
+        other_domain = self.client.post("/api/auth/register", json={
+            "fullName": "Someone Else", "username": "someoneelse",
+            "email": "someone@gmail.com", "password": PASSWORD, "universityId": 1,
+        })
+        self.assertEqual(other_domain.status_code, 400, other_domain.text)
+
+    def test_cursor_pagination_round_trip(self):
+        user_id, headers = self.login(self.register("cursoruser"))
+        product_ids = [self.create_product(headers, f"Cursor product {i}") for i in range(5)]
+
+        seen = []
+        params = {"userId": user_id, "limit": 2}
+        page = self.client.get("/api/products", params=params).json()
+        seen += [product["id"] for product in page["products"]]
+        while page["nextCursor"]:
+            response = self.client.get("/api/products", params={**params, "cursor": page["nextCursor"]})
+            self.assertEqual(response.status_code, 200, response.text)
+            page = response.json()
+            self.assertIsNone(page["totalResults"])
+            seen += [product["id"] for product in page["products"]]
+
+        # Every product exactly once, newest first
+        self.assertEqual(seen, product_ids[::-1])
+
+        bad = self.client.get("/api/products", params={"cursor": "not-a-cursor"})
+        self.assertEqual(bad.status_code, 400)
+
+    def test_saved_item_toggle(self):
+        _, seller = self.login(self.register("saveseller"))
+        _, buyer = self.login(self.register("savebuyer"))
+        product_id = self.create_product(seller, "Saved product")
+
+        def toggle():
+            response = self.client.post("/api/saved-items", headers=buyer, json={"productId": product_id})
+            self.assertEqual(response.status_code, 200, response.text)
+            return response.json()["isSaved"]
+
+        def saved_ids():
+            return [product["id"] for product in self.client.get("/api/saved-items", headers=buyer).json()]
+
+        self.assertTrue(toggle())
+        self.assertEqual(saved_ids(), [product_id])  # Saved once, not twice
+        self.assertFalse(toggle())
+        self.assertEqual(saved_ids(), [])
+        self.assertTrue(toggle())
+        self.assertEqual(saved_ids(), [product_id])
+
+        missing = self.client.post("/api/saved-items", headers=buyer, json={"productId": 999999})
+        self.assertEqual(missing.status_code, 404)
+
+    def test_unchanged_product_returns_304(self):
+        _, headers = self.login(self.register("etaguser"))
+        product_id = self.create_product(headers, "ETag product")
+
+        first = self.client.get(f"/api/products/{product_id}")
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers["etag"]
+
+        cached = self.client.get(f"/api/products/{product_id}", headers={"If-None-Match": etag})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b"")
+
+        # After an edit the old ETag no longer matches
+        self.client.put(f"/api/products/{product_id}", headers=headers, json={"price": 25})
+        changed = self.client.get(f"/api/products/{product_id}", headers={"If-None-Match": etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()["price"], 25)
+
+    def test_unread_count_after_mark_read(self):
+        sender_id, sender = self.login(self.register("msgsender"))
+        receiver_id, receiver = self.login(self.register("msgreceiver"))
+        for content in ("hello", "are you there?"):
+            response = self.client.post("/api/messages", headers=sender, json={"receiverId": receiver_id, "content": content})
+            self.assertEqual(response.status_code, 200, response.text)
+
+        def unread_from_sender():
+            conversations = self.client.get("/api/conversations", headers=receiver).json()
+            return next(c["unreadCount"] for c in conversations if c["id"] == sender_id)
+
+        self.assertEqual(unread_from_sender(), 2)
+        response = self.client.put(f"/api/messages/{sender_id}/mark-read", headers=receiver)
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertEqual(unread_from_sender(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
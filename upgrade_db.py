@@ -1,8 +1,39 @@
 import os
 import sqlalchemy
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, inspect, text
 from backend.database import SQLALCHEMY_DATABASE_URL
 
+def _rebuild_sqlite_product_images(connection) -> bool:
+    """
+    Re-create product_images with AUTOINCREMENT (step 6). Not committed here.
+    
+    RETURNS: True if the table was rebuilt, False if it already had AUTOINCREMENT
+    """
+    from backend.models import ProductImage
+    
+    table_sql = connection.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'product_images'"
+    )).scalar()
+    if not table_sql or "AUTOINCREMENT" in table_sql.upper():
+        return False
+    
+    old_columns = {column["name"] for column in inspect(connection).get_columns("product_images")}
+    old_indexes = [index["name"] for index in inspect(connection).get_indexes("product_images")]
+    
+    connection.execute(text("ALTER TABLE product_images RENAME TO product_images_old"))
+    # Indexes move with the renamed table; drop them so the new table
+    # can create its own under the same names
+    for index_name in old_indexes:
+        connection.execute(text(f'DROP INDEX IF EXISTS "{index_name}"'))
+    ProductImage.__table__.create(connection)
+    
+    columns = ", ".join(c.name for c in ProductImage.__table__.columns if c.name in old_columns)
+    connection.execute(text(
+        f"INSERT INTO product_images ({columns}) SELECT {columns} FROM product_images_old"
+    ))
+    connection.execute(text("DROP TABLE product_images_old"))
+    return True
+
 def upgrade_database():
     print("=== UPGRADING DATABASE SCHEMA ===")
     print(f"Connecting to: {SQLALCHEMY_DATABASE_URL}")
@@ -35,6 +66,71 @@ def upgrade_database():
                 print(f"❌ Error adding column to users: {e}")
                 
         connection.commit()
+
+        # 3. Every product image belongs to a product again
+        # Uploads waiting to be used now live in uploaded_images, so old
+        # unattached rows (product_id NULL) are leftovers nothing points at.
+        # Delete them and put NOT NULL back (PostgreSQL; SQLite gets it from
+        # the rebuild in step 6)
+        try:
+            print("Checking product_images.product_id...")
+            result = connection.execute(text("DELETE FROM product_images WHERE product_id IS NULL;"))
+            if connection.dialect.name == "postgresql":
+                connection.execute(text("ALTER TABLE product_images ALTER COLUMN product_id SET NOT NULL;"))
+            connection.commit()
+            print(f"✅ Removed {result.rowcount} unattached images, product_images.product_id is required")
+        except Exception as e:
+            connection.rollback()
+            print(f"❌ Error updating product_images.product_id: {e}")
+        
+        # 4. Point uploaded images at their ID-based URL (/api/images/{id})
+        # Images attached before this change kept a placeholder URL
+        # (/api/images/<uuid>.jpg) which could only be served by searching
+        # every image row for the filename
+        try:
+            print("Checking product_images URLs...")
+            result = connection.execute(text(
+                "UPDATE product_images SET image_url = '/api/images/' || CAST(id AS VARCHAR(20)) "
+                "WHERE image_url LIKE '/api/images/%' AND image_data IS NOT NULL "
+                "AND image_url <> '/api/images/' || CAST(id AS VARCHAR(20))"
+            ))
+            connection.commit()
+            print(f"✅ Updated {result.rowcount} image URLs")
+        except Exception as e:
+            connection.rollback()
+            print(f"❌ Error updating image URLs: {e}")
+        
+        # 5. Drop the old (sender_id, receiver_id) messages index
+        # idx_messages_sender_receiver_created starts with the same columns,
+        # so the old one only slows down every new message
+        try:
+            print("Checking messages indexes...")
+            connection.execute(text("DROP INDEX IF EXISTS idx_messages_sender_receiver"))
+            connection.commit()
+            print("✅ Dropped idx_messages_sender_receiver (if it existed)")
+        except Exception as e:
+            connection.rollback()
+            print(f"❌ Error dropping idx_messages_sender_receiver: {e}")
+        
+        # 6. SQLite only: re-create product_images with AUTOINCREMENT
+        # Image IDs are used in image URLs, and a plain SQLite table reuses the
+        # highest ID after that row is deleted - so an old URL (or a browser's
+        # cached copy of it) could end up pointing at someone else's new upload.
+        # SQLite can't add AUTOINCREMENT to an existing table, so the table is
+        # renamed, created again from the model, and the rows copied over (IDs
+        # kept). This copies every image, so it's a one-off step here rather
+        # than something the server does at startup.
+        if connection.dialect.name == "sqlite":
+            try:
+                print("Checking product_images AUTOINCREMENT...")
+                if _rebuild_sqlite_product_images(connection):
+                    connection.commit()
+                    print("✅ Rebuilt product_images with AUTOINCREMENT (image IDs are never reused)")
+                else:
+                    print("ℹ️ product_images already uses AUTOINCREMENT")
+            except Exception as e:
+                connection.rollback()
+                print(f"❌ Error rebuilding product_images: {e}")
     
     print("\n=== UPGRADE COMPLETE ===")
 
@@ -15,7 +15,7 @@ def verify_image(image_id):
             print(f"Content-Type: {content_type}")
             print(f"Content-Length: {content_length} bytes")
             
-            if status_code == 200 and content_type == 'image/jpeg':
+            if status_code == 200 and content_type.startswith('image/'):
                 print("✅ SUCCESS: Image served correctly from DB!")
                 return True
             else: